@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+import base64
+import contextlib
+import copy
+import csv
+import hashlib
+import io
+import os
+import shutil
+import tarfile
+import zipfile
+from collections.abc import Callable
+from typing import Literal
+
+_ZIP_SUFFIXES = ('.zip', '.whl')
+_TarWriteMode = Literal['w|', 'w|gz', 'w|bz2', 'w|xz']
+_TAR_SUFFIXES: dict[str, _TarWriteMode] = {
+    '.tar': 'w|',
+    '.tar.gz': 'w|gz', '.tgz': 'w|gz',
+    '.tar.bz2': 'w|bz2', '.tbz2': 'w|bz2',
+    '.tar.xz': 'w|xz', '.txz': 'w|xz',
+}
+
+# called with the name and contents of each `.py` member, returns the
+# rewritten contents or `None` to keep them
+Fix = Callable[[str, bytes], bytes | None]
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def is_archive(filename: str) -> bool:
+    return filename.lower().endswith((*_ZIP_SUFFIXES, *_TAR_SUFFIXES))
+
+
+def _tar_write_mode(filename: str) -> _TarWriteMode:
+    lower = filename.lower()
+    for suffix, mode in _TAR_SUFFIXES.items():
+        if lower.endswith(suffix):
+            return mode
+    raise AssertionError(f'unreachable: {filename}')
+
+
+def _is_record(name: str) -> bool:
+    head, _, tail = name.rpartition('/')
+    return tail == 'RECORD' and head.endswith('.dist-info')
+
+
+def _update_record(record: bytes, rewritten: dict[str, bytes]) -> bytes:
+    """update the hashes and sizes of rewritten files in a wheel RECORD"""
+    out = io.StringIO()
+    writer = csv.writer(out, lineterminator='\n')
+    for row in csv.reader(io.StringIO(record.decode())):
+        if row and row[0] in rewritten:
+            contents = rewritten[row[0]]
+            digest = hashlib.sha256(contents).digest()
+            b64 = base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+            row[1:] = [f'sha256={b64}', str(len(contents))]
+        writer.writerow(row)
+    return out.getvalue().encode()
+
+
+def _process_zip(filename: str, fix: Fix, tmp: str | None) -> bool:
+    is_wheel = filename.lower().endswith('.whl')
+    rewritten: dict[str, bytes] = {}
+    with contextlib.ExitStack() as ctx:
+        zf = ctx.enter_context(zipfile.ZipFile(filename))
+        if tmp is None:
+            out = None
+        else:
+            out = ctx.enter_context(zipfile.ZipFile(tmp, 'w'))
+
+        record = None
+        for info in zf.infolist():
+            if is_wheel and _is_record(info.filename):
+                record = info  # written last, once the new hashes are known
+            elif not info.is_dir() and info.filename.endswith('.py'):
+                contents = zf.read(info)
+                new_contents = fix(info.filename, contents)
+                if new_contents is not None:
+                    rewritten[info.filename] = contents = new_contents
+                if out is not None:
+                    out.writestr(info, contents)
+            elif out is not None:
+                # everything else is copied without reading it into memory
+                with zf.open(info) as src, out.open(info, 'w') as dst:
+                    shutil.copyfileobj(src, dst)
+
+        if out is not None and record is not None:
+            out.writestr(record, _update_record(zf.read(record), rewritten))
+    return bool(rewritten)
+
+
+def _process_tar(filename: str, fix: Fix, tmp: str | None) -> bool:
+    changed = False
+    with contextlib.ExitStack() as ctx:
+        # `|` modes read and write sequentially without seeking
+        tf = ctx.enter_context(tarfile.open(filename, 'r|*'))
+        if tmp is None:
+            out = None
+        else:
+            mode = _tar_write_mode(filename)
+            out = ctx.enter_context(tarfile.open(tmp, mode))
+
+        for member in tf:
+            if member.isfile() and member.name.endswith('.py'):
+                src = tf.extractfile(member)
+                assert src is not None
+                contents = src.read()
+                new_contents = fix(member.name, contents)
+                if new_contents is not None:
+                    changed = True
+                    contents = new_contents
+                    member = copy.copy(member)
+                    member.size = len(contents)
+                if out is not None:
+                    out.addfile(member, io.BytesIO(contents))
+            elif out is not None:
+                # links (even to `.py` files) and directories have no data
+                # and `extractfile` would try to follow links in the stream
+                if member.isfile():
+                    out.addfile(member, tf.extractfile(member))
+                else:
+                    out.addfile(member)
+    return changed
+
+
+def process(filename: str, fix: Fix, *, write: bool) -> bool:
+    """pass each `.py` member of a zip / wheel / tar archive to `fix`
+
+    members are streamed from the archive, nothing is extracted to disk.
+    with `write` the archive is replaced by one with the rewritten members
+    (updating the RECORD of wheels) if any changed.  returns whether any
+    member changed
+    """
+    tmp = f'{filename}.tmp' if write else None
+    try:
+        if filename.lower().endswith(_ZIP_SUFFIXES):
+            changed = _process_zip(filename, fix, tmp)
+        else:
+            changed = _process_tar(filename, fix, tmp)
+    except BaseException as e:
+        if tmp is not None and os.path.exists(tmp):
+            os.remove(tmp)
+        if isinstance(e, (tarfile.TarError, zipfile.BadZipFile, EOFError)):
+            raise ArchiveError(str(e)) from e
+        raise
+
+    if tmp is not None:
+        if changed:
+            os.replace(tmp, filename)
+        else:
+            os.remove(tmp)
+    return changed
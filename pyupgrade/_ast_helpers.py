@@ -1,20 +1,47 @@
 from __future__ import annotations
 
 import ast
+import sys
+import threading
 import warnings
+from collections.abc import Callable
 from collections.abc import Container
 from collections.abc import Iterable
 from typing import Any
 from typing import NamedTuple
+from typing import TypeVar
 
 from tokenize_rt import Offset
 
+T = TypeVar('T')
 
-def ast_parse(contents_text: str) -> ast.Module:
+
+# `catch_warnings()` swaps the process-wide filters so threads take turns,
+# unless warnings are context aware (the default on free-threaded 3.14+)
+_WARNINGS_LOCK = threading.Lock()
+_SHARED_FILTERS = not getattr(sys.flags, 'context_aware_warnings', False)
+# what `warnings.simplefilter('ignore')` puts in front of the filters
+_IGNORE_ALL = ('ignore', None, Warning, None, 0)
+
+
+def _parse(contents: bytes) -> ast.Module:
     # intentionally ignore warnings, we might be fixing warning-ridden syntax
     with warnings.catch_warnings():
         warnings.simplefilter('ignore')
-        return ast.parse(contents_text.encode())
+        return ast.parse(contents)
+
+
+def ast_parse(contents: str | bytes) -> ast.Module:
+    if isinstance(contents, str):
+        contents = contents.encode()
+    if not _SHARED_FILTERS:  # pragma: no cover (free-threaded builds)
+        return _parse(contents)
+    elif warnings.filters[:1] == [_IGNORE_ALL]:
+        # already ignored (see `--jobs`): no need to swap them, or to wait
+        return ast.parse(contents)
+    else:
+        with _WARNINGS_LOCK:
+            return _parse(contents)
 
 
 def ast_to_offset(node: ast.expr | ast.stmt) -> Offset:
@@ -46,12 +73,84 @@ def has_starargs(call: ast.Call) -> bool:
     )
 
 
+class Summary(NamedTuple):
+    contains_await: bool
+    contains_yield: bool
+    contains_starred: bool
+
+
+_SUMMARY_ATTR = '_pyupgrade_summary'
+
+
+def _summarize(node: ast.AST, children: list[Summary]) -> Summary:
+    # only constant-size facts: anything which grows with the subtree (eg
+    # the names it loads) would make long chains (`a + b + ...`) quadratic
+    return Summary(
+        contains_await=(
+            isinstance(node, ast.Await) or
+            any(child.contains_await for child in children)
+        ),
+        contains_yield=(
+            isinstance(node, (ast.Yield, ast.YieldFrom)) or
+            any(child.contains_yield for child in children)
+        ),
+        contains_starred=(
+            isinstance(node, ast.Starred) or
+            any(child.contains_starred for child in children)
+        ),
+    )
+
+
+def _cached_postorder(
+        node: ast.AST,
+        attr: str,
+        compute: Callable[[ast.AST], T],
+) -> T:
+    """compute `attr` for every node in the subtree, children first
+
+    `compute` may rely on `attr` already being set on all of its children.
+    values are stored on the nodes so already-computed subtrees are skipped.
+    """
+    ret: T | None = getattr(node, attr, None)
+    if ret is not None:
+        return ret
+
+    todo = [(node, False)]
+    while todo:
+        node_, children_done = todo.pop()
+        if hasattr(node_, attr):
+            continue
+        elif children_done:
+            setattr(node_, attr, compute(node_))
+        else:
+            todo.append((node_, True))
+            todo.extend(
+                (child, False)
+                for child in ast.iter_child_nodes(node_)
+                if not hasattr(child, attr)
+            )
+
+    return getattr(node, attr)
+
+
+def _compute_summary(node: ast.AST) -> Summary:
+    children = [
+        getattr(child, _SUMMARY_ATTR) for child in ast.iter_child_nodes(node)
+    ]
+    return _summarize(node, children)
+
+
+def node_summary(node: ast.AST) -> Summary:
+    """properties of the subtree rooted at `node`
+
+    computed bottom-up once and cached on each node so repeated questions
+    about overlapping subtrees are answered without walking them again.
+    """
+    return _cached_postorder(node, _SUMMARY_ATTR, _compute_summary)
+
+
 def contains_await(node: ast.AST) -> bool:
-    for node_ in ast.walk(node):
-        if isinstance(node_, ast.Await):
-            return True
-    else:
-        return False
+    return node_summary(node).contains_await
 
 
 def is_async_listcomp(node: ast.ListComp) -> bool:
@@ -111,7 +210,45 @@ def _fields_same(n1: ast.AST, n2: ast.AST) -> bool:
     return True
 
 
+_HASH_ATTR = '_pyupgrade_hash'
+
+
+def _hash_value(value: object) -> object:
+    if isinstance(value, ast.AST):
+        return getattr(value, _HASH_ATTR)
+    elif isinstance(value, list):
+        return tuple(_hash_value(v) for v in value)
+    else:
+        try:
+            hash(value)
+        except TypeError:  # pragma: no cover (not produced by ast.parse)
+            return type(value)
+        else:
+            return value
+
+
+def _compute_hash(node: ast.AST) -> int:
+    return hash((
+        type(node),
+        *(
+            (name, _hash_value(value))
+            for name, value in ast.iter_fields(node)
+            # ignore `ast.Load` / `ast.Store`
+            if not isinstance(value, ast.expr_context)
+        ),
+    ))
+
+
+def structural_hash(node: ast.AST) -> int:
+    """a hash which is equal for nodes which are `ast_eq`"""
+    return _cached_postorder(node, _HASH_ATTR, _compute_hash)
+
+
 def ast_eq(n1: ast.AST, n2: ast.AST) -> bool:
+    # differing hashes are conclusive, equal hashes need to be confirmed
+    if structural_hash(n1) != structural_hash(n2):
+        return False
+
     for t1, t2 in zip(ast.walk(n1), ast.walk(n2)):
         # ignore `ast.Load` / `ast.Store`
         if _all_isinstance((t1, t2), ast.expr_context):
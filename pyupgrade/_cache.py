@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+import argparse
+import os
+import sqlite3
+import time
+from collections.abc import Collection
+from collections.abc import Sequence
+from typing import NamedTuple
+
+_SCHEMA = '''\
+CREATE TABLE IF NOT EXISTS results (
+    settings TEXT NOT NULL,
+    blob TEXT NOT NULL,
+    -- the rewritten contents, NULL if the file needed no changes
+    fixed BLOB,
+    last_used INTEGER NOT NULL,
+    PRIMARY KEY (settings, blob)
+)
+'''
+
+
+class Stats(NamedTuple):
+    entries: int
+    clean: int
+    rewritten: int
+    settings: int
+    size: int
+
+
+class Cache:
+    """results by settings key and blob id, in a single sqlite file
+
+    clean files are stored as `NULL` so the common case takes little space.
+    the database uses WAL mode so concurrent processes (CI shards, editor
+    integrations) can share it
+    """
+
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        self.db = sqlite3.connect(filename, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute(_SCHEMA)
+
+    def close(self) -> None:
+        self.db.close()
+
+    def lookup(
+            self,
+            key: str,
+            blobs: Collection[str],
+    ) -> dict[str, bytes | None]:
+        """find every blob of a worklist (in one query)"""
+        with self.db:
+            self.db.execute(
+                'CREATE TEMP TABLE IF NOT EXISTS worklist '
+                '(blob TEXT PRIMARY KEY)',
+            )
+            self.db.execute('DELETE FROM worklist')
+            self.db.executemany(
+                'INSERT OR IGNORE INTO worklist VALUES (?)',
+                ((blob,) for blob in blobs),
+            )
+            rows = self.db.execute(
+                'SELECT results.blob, results.fixed '
+                'FROM results JOIN worklist USING (blob) '
+                'WHERE results.settings = ?',
+                (key,),
+            ).fetchall()
+            self.db.execute(
+                'UPDATE results SET last_used = ? '
+                'WHERE settings = ? AND blob IN (SELECT blob FROM worklist)',
+                (int(time.time()), key),
+            )
+        return dict(rows)
+
+    def store(
+            self,
+            key: str,
+            entries: dict[str, bytes | None],
+    ) -> None:
+        now = int(time.time())
+        with self.db:
+            self.db.executemany(
+                'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)',
+                (
+                    (key, blob, fixed, now)
+                    for blob, fixed in entries.items()
+                ),
+            )
+
+    def stats(self) -> Stats:
+        entries, clean, settings = self.db.execute(
+            'SELECT COUNT(*), COUNT(*) - COUNT(fixed), '
+            'COUNT(DISTINCT settings) FROM results',
+        ).fetchone()
+        return Stats(
+            entries=entries,
+            clean=clean,
+            rewritten=entries - clean,
+            settings=settings,
+            size=os.path.getsize(self.filename),
+        )
+
+    def prune(self, max_age: float) -> int:
+        """remove entries unused for `max_age` seconds"""
+        with self.db:
+            cursor = self.db.execute(
+                'DELETE FROM results WHERE last_used < ?',
+                (int(time.time() - max_age),),
+            )
+        self.db.execute('VACUUM')
+        return cursor.rowcount
+
+    def export(self, filename: str) -> None:
+        """write a compact standalone copy (eg for a CI artifact)"""
+        self.db.execute('VACUUM INTO ?', (filename,))
+
+    def merge(self, filename: str) -> int:
+        """add the entries from another cache, keeping the newest"""
+        self.db.execute('ATTACH DATABASE ? AS other', (filename,))
+        try:
+            with self.db:
+                cursor = self.db.execute(
+                    'INSERT INTO results '
+                    'SELECT settings, blob, fixed, last_used '
+                    'FROM other.results WHERE true '
+                    'ON CONFLICT (settings, blob) DO UPDATE SET '
+                    'fixed = excluded.fixed, last_used = excluded.last_used '
+                    'WHERE excluded.last_used > results.last_used',
+                )
+        finally:
+            self.db.execute('DETACH DATABASE other')
+        return cursor.rowcount
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='pyupgrade-cache')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    stats_parser = subparsers.add_parser(
+        'stats', help='show what a cache contains',
+    )
+    stats_parser.add_argument('cache')
+
+    prune_parser = subparsers.add_parser(
+        'prune', help='remove entries which have not been used recently',
+    )
+    prune_parser.add_argument('cache')
+    prune_parser.add_argument(
+        '--max-age-days', type=float, default=30,
+        help='(default: %(default)s)',
+    )
+
+    export_parser = subparsers.add_parser(
+        'export', help='write a compact copy of a cache',
+    )
+    export_parser.add_argument('cache')
+    export_parser.add_argument('dest')
+
+    merge_parser = subparsers.add_parser(
+        'merge', help='add the entries of other caches (eg from CI shards)',
+    )
+    merge_parser.add_argument('cache')
+    merge_parser.add_argument('sources', nargs='+')
+
+    args = parser.parse_args(argv)
+
+    # merging is the only command which may create the cache
+    required = args.sources if args.command == 'merge' else [args.cache]
+    for filename in required:
+        if not os.path.exists(filename):
+            print(f'{filename}: no such cache')
+            return 1
+
+    cache = Cache(args.cache)
+    try:
+        if args.command == 'stats':
+            for name, value in cache.stats()._asdict().items():
+                print(f'{name}: {value}')
+        elif args.command == 'prune':
+            removed = cache.prune(args.max_age_days * 24 * 60 * 60)
+            print(f'removed {removed} entries')
+        elif args.command == 'export':
+            if os.path.exists(args.dest):
+                print(f'{args.dest}: already exists')
+                return 1
+            cache.export(args.dest)
+        else:
+            for source in args.sources:
+                merged = cache.merge(source)
+                print(f'{source}: merged {merged} entries')
+    finally:
+        cache.close()
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -2,8 +2,12 @@ from __future__ import annotations
 
 import ast
 import collections
+import hashlib
+import importlib.metadata
 import pkgutil
+import sys
 from collections.abc import Callable
+from collections.abc import Generator
 from collections.abc import Iterable
 from typing import NamedTuple
 from typing import Protocol
@@ -13,6 +17,7 @@ from tokenize_rt import Offset
 from tokenize_rt import Token
 
 from pyupgrade import _plugins
+from pyupgrade._deadline import check_deadline
 
 Version = tuple[int, ...]
 
@@ -24,14 +29,58 @@ class Settings(NamedTuple):
     keep_runtime_typing: bool = False
 
 
+def settings_key(settings: Settings) -> str:
+    """a key identifying the output produced for `settings`
+
+    the output also depends on the interpreter (what parses, how f-strings
+    tokenize) and on tokenize-rt
+    """
+    versions = []
+    for dist in ('pyupgrade', 'tokenize-rt'):
+        try:
+            versions.append(importlib.metadata.version(dist))
+        except importlib.metadata.PackageNotFoundError:  # pragma: no cover
+            versions.append('unknown')
+    python = f'{sys.implementation.name}{sys.version_info[:2]}'
+    key = '\0'.join((*versions, python, repr(tuple(settings)))).encode()
+    return hashlib.sha256(key).hexdigest()[:16]
+
+
+AST_T = TypeVar('AST_T', bound=ast.AST)
+TokenFunc = Callable[[int, list[Token]], None]
+ScopeExitFunc = Callable[[], Iterable[tuple[Offset, TokenFunc]]]
+
+SCOPE_TYPES = (
+    ast.ClassDef, ast.FunctionDef, ast.AsyncFunctionDef, ast.Lambda,
+    ast.ListComp, ast.SetComp, ast.DictComp, ast.GeneratorExp,
+)
+
+
+class Scope:
+    """names read and written by a class / function / comprehension
+
+    `reads` and `writes` are only complete once the scope has been exited,
+    functions which need them can be added to `exit_funcs`.  names which are
+    read but not written in a nested scope count as reads in the parent.
+    """
+
+    def __init__(self, node: ast.AST, parent: Scope | None) -> None:
+        self.node = node
+        self.parent = parent
+
+        self.reads: collections.Counter[str] = collections.Counter()
+        self.writes: set[str] = set()
+
+        self.exit_funcs: list[ScopeExitFunc] = []
+
+
 class State(NamedTuple):
     settings: Settings
     from_imports: dict[str, set[str]]
     in_annotation: bool = False
+    scopes: tuple[Scope, ...] = ()
 
 
-AST_T = TypeVar('AST_T', bound=ast.AST)
-TokenFunc = Callable[[int, list[Token]], None]
 ASTFunc = Callable[[State, AST_T, ast.AST], Iterable[tuple[Offset, TokenFunc]]]
 
 RECORD_FROM_IMPORTS = frozenset((
@@ -54,8 +103,7 @@ RECORD_FROM_IMPORTS = frozenset((
     'typing_extensions',
 ))
 
-FUNCS: ASTCallbackMapping  # python/mypy#17566
-FUNCS = collections.defaultdict(list)  # type: ignore[assignment]
+FUNCS: ASTCallbackMapping = collections.defaultdict(list)
 
 
 def register(tp: type[AST_T]) -> Callable[[ASTFunc[AST_T]], ASTFunc[AST_T]]:
@@ -68,27 +116,55 @@ def register(tp: type[AST_T]) -> Callable[[ASTFunc[AST_T]], ASTFunc[AST_T]]:
 class ASTCallbackMapping(Protocol):
     def __getitem__(self, tp: type[AST_T]) -> list[ASTFunc[AST_T]]: ...
 
+    def get(
+            self,
+            tp: type[AST_T],
+            default: list[ASTFunc[AST_T]],
+            /,
+    ) -> list[ASTFunc[AST_T]]: ...
 
-def visit(
+
+def _exit_scope(
+        scope: Scope,
+) -> Generator[tuple[ScopeExitFunc, Offset, TokenFunc]]:
+    for exit_func in scope.exit_funcs:
+        for offset, token_func in exit_func():
+            yield exit_func, offset, token_func
+
+    if scope.parent is not None:
+        scope.parent.reads.update(
+            name
+            for name, count in scope.reads.items()
+            if count > 0 and name not in scope.writes
+        )
+
+
+def iter_callbacks(
         funcs: ASTCallbackMapping,
         tree: ast.Module,
         settings: Settings,
-) -> dict[Offset, list[TokenFunc]]:
+) -> Generator[tuple[Callable[..., object], Offset, TokenFunc]]:
     initial_state = State(
         settings=settings,
         from_imports=collections.defaultdict(set),
     )
 
-    nodes: list[tuple[State, ast.AST, ast.AST]] = [(initial_state, tree, tree)]
+    nodes: list[tuple[State, ast.AST, ast.AST] | Scope]
+    nodes = [(initial_state, tree, tree)]
 
-    ret = collections.defaultdict(list)
     while nodes:
-        state, node, parent = nodes.pop()
+        check_deadline()
+        item = nodes.pop()
+        if isinstance(item, Scope):
+            yield from _exit_scope(item)
+            continue
 
-        tp = type(node)
-        for ast_func in funcs[tp]:
+        state, node, parent = item
+
+        # `.get()` so a `defaultdict` (`FUNCS`) is never mutated while visiting
+        for ast_func in funcs.get(type(node), []):
             for offset, token_func in ast_func(state, node, parent):
-                ret[offset].append(token_func)
+                yield ast_func, offset, token_func
 
         if (
                 isinstance(node, ast.ImportFrom) and
@@ -98,6 +174,16 @@ def visit(
             state.from_imports[node.module].update(
                 name.name for name in node.names if not name.asname
             )
+        elif isinstance(node, ast.Name) and state.scopes:
+            if isinstance(node.ctx, ast.Load):
+                state.scopes[-1].reads[node.id] += 1
+            else:
+                state.scopes[-1].writes.add(node.id)
+        elif isinstance(node, SCOPE_TYPES):
+            scope = Scope(node, state.scopes[-1] if state.scopes else None)
+            # exited once all of the children have been visited
+            nodes.append(scope)
+            state = state._replace(scopes=(*state.scopes, scope))
 
         for name in reversed(node._fields):
             value = getattr(node, name)
@@ -112,9 +198,24 @@ def visit(
                 for value in reversed(value):
                     if isinstance(value, ast.AST):
                         nodes.append((next_state, value, node))
+
+
+def visit(
+        funcs: ASTCallbackMapping,
+        tree: ast.Module,
+        settings: Settings,
+) -> dict[Offset, list[TokenFunc]]:
+    ret = collections.defaultdict(list)
+    for _, offset, token_func in iter_callbacks(funcs, tree, settings):
+        ret[offset].append(token_func)
     return ret
 
 
+def plugin_name(func: Callable[..., object]) -> str:
+    _, _, name = func.__module__.rpartition('.')
+    return name
+
+
 def _import_plugins() -> None:
     plugins_path = _plugins.__path__
     mod_infos = pkgutil.walk_packages(plugins_path, f'{_plugins.__name__}.')
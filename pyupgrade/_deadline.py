@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import time
+from collections.abc import Generator
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+_DEADLINE: contextvars.ContextVar[float | None]
+_DEADLINE = contextvars.ContextVar('_DEADLINE', default=None)
+
+
+@contextlib.contextmanager
+def deadline(seconds: float | None) -> Generator[None]:
+    """make `check_deadline` raise once `seconds` have passed
+
+    threads can't be interrupted so this is cooperative: the long loops
+    (visiting the ast and rewriting tokens) check it as they go
+    """
+    if seconds is None:
+        yield
+        return
+
+    token = _DEADLINE.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _DEADLINE.reset(token)
+
+
+def check_deadline() -> None:
+    end = _DEADLINE.get()
+    if end is not None and time.monotonic() > end:
+        raise DeadlineExceeded
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import difflib
+import io
+from typing import Any
+from typing import NamedTuple
+
+
+class Position(NamedTuple):
+    line: int
+    character: int
+
+
+class Edit(NamedTuple):
+    start: Position
+    end: Position
+    replacement: str
+
+    def to_json(self) -> dict[str, Any]:
+        """format the edit as a language server protocol `TextEdit`"""
+        return {
+            'range': {
+                'start': self.start._asdict(),
+                'end': self.end._asdict(),
+            },
+            'newText': self.replacement,
+        }
+
+
+def split_lines(s: str) -> list[str]:
+    # unlike `str.splitlines` this only splits on `\r`, `\n` and `\r\n`
+    return io.StringIO(s, newline='').readlines()
+
+
+def _position(lines: list[str], i: int) -> Position:
+    if i == len(lines) and lines and not lines[-1].endswith(('\r', '\n')):
+        return Position(i - 1, len(lines[-1]))
+    else:
+        return Position(i, 0)
+
+
+def compute_edits(before: str, after: str) -> list[Edit]:
+    """compute minimal whole-line edits which turn `before` into `after`
+
+    positions are 0-based and counted in code points.
+    """
+    before_lines = split_lines(before)
+    after_lines = split_lines(after)
+    matcher = difflib.SequenceMatcher(
+        None, before_lines, after_lines, autojunk=False,
+    )
+    return [
+        Edit(
+            _position(before_lines, i1),
+            _position(before_lines, i2),
+            ''.join(after_lines[j1:j2]),
+        )
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes()
+        if tag != 'equal'
+    ]
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import hashlib
+import os.path
+import subprocess
+import threading
+from collections.abc import Generator
+from collections.abc import Sequence
+
+
+def _git(*cmd: str) -> bytes:
+    return subprocess.run(
+        ('git', *cmd),
+        stdin=subprocess.DEVNULL,
+        capture_output=True,
+        check=True,
+    ).stdout
+
+
+def _zsplit(s: bytes) -> list[str]:
+    return [part for part in os.fsdecode(s).split('\0') if part]
+
+
+def blob_id(contents: bytes) -> str:
+    """compute the same object id `git hash-object` would for `contents`"""
+    h = hashlib.sha1(b'blob %d\0' % len(contents))
+    h.update(contents)
+    return h.hexdigest()
+
+
+def normpath(filename: str) -> str:
+    return os.path.normcase(os.path.realpath(filename))
+
+
+def tree_blobs(rev: str, pathspecs: Sequence[str]) -> list[tuple[str, str]]:
+    """(path, blob id) of the python files in the tree of `rev`
+
+    paths are relative to the root of the repository
+    """
+    out = _git('ls-tree', '-r', '-z', '--full-name', rev, '--', *pathspecs)
+    ret = []
+    for line in _zsplit(out):
+        info, path = line.split('\t', 1)
+        mode, _, sha = info.split()
+        # skip symlinks / submodules
+        if mode in {'100644', '100755'} and path.endswith('.py'):
+            ret.append((path, sha))
+    return ret
+
+
+def cat_blobs(shas: Sequence[str]) -> Generator[tuple[str, bytes]]:
+    """the contents of each blob, read through one `git cat-file --batch`"""
+    proc = subprocess.Popen(
+        ('git', 'cat-file', '--batch'),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+    )
+    assert proc.stdin is not None and proc.stdout is not None
+    stdin, stdout = proc.stdin, proc.stdout
+
+    # requests are written from another thread so neither pipe can fill up
+    # while the other side waits
+    def _write() -> None:
+        try:
+            for sha in shas:
+                stdin.write(f'{sha}\n'.encode())
+            stdin.close()
+        except OSError:  # the reader stopped early
+            pass
+
+    writer = threading.Thread(target=_write, daemon=True)
+    writer.start()
+    try:
+        for sha in shas:
+            header = stdout.readline().split()
+            # `<sha> blob <size>` or `<sha> missing`
+            if len(header) != 3 or header[1] != b'blob':
+                raise ValueError(f'{sha}: not a blob')
+            contents = stdout.read(int(header[2]))
+            stdout.read(1)  # newline after the contents
+            yield sha, contents
+    finally:
+        proc.kill()
+        proc.wait()
+        writer.join()
+        stdout.close()
+
+
+def _repo_key(path: str) -> str:
+    # purely lexical: resolving symlinks costs a stat per path component
+    return os.path.normcase(os.path.normpath(path))
+
+
+class GitIndex:
+    def __init__(
+            self,
+            git_dir: str,
+            root: str,
+            prefix: str,
+            blob_ids: dict[str, str],
+    ) -> None:
+        self.git_dir = git_dir
+        self.root = root
+        # the current directory relative to `root`
+        self.prefix = prefix
+        # tracked files whose working tree contents match the index, keyed
+        # by their path relative to `root`
+        self.blob_ids = blob_ids
+
+    @classmethod
+    def read(cls) -> GitIndex:
+        # `--show-prefix` is an empty line at the top level
+        root, git_dir, prefix = os.fsdecode(_git(
+            'rev-parse', '--show-toplevel', '--absolute-git-dir',
+            '--show-prefix',
+        )).split('\n')[:3]
+
+        dirty = {
+            _repo_key(filename)
+            for filename in _zsplit(
+                _git('-C', root, 'diff', '--name-only', '--no-renames', '-z'),
+            )
+        }
+
+        blob_ids = {}
+        for line in _zsplit(_git('-C', root, 'ls-files', '--stage', '-z')):
+            info, filename = line.split('\t', 1)
+            mode, sha, stage = info.split()
+            # skip symlinks / submodules / unmerged paths
+            if mode not in {'100644', '100755'} or stage != '0':
+                continue
+            key = _repo_key(filename)
+            if key not in dirty:
+                blob_ids[key] = sha
+
+        return cls(git_dir, root, prefix, blob_ids)
+
+    def lookup(self, filename: str) -> str | None:
+        """the blob id of `filename` if it is tracked and unmodified"""
+        if os.path.isabs(filename):
+            filename = os.path.relpath(filename, self.root)
+        else:
+            filename = os.path.join(self.prefix, filename)
+        return self.blob_ids.get(_repo_key(filename))
+
+    def _store(self, key: str) -> str:
+        return os.path.join(self.git_dir, 'pyupgrade', f'clean-{key}')
+
+    def load_clean(self, key: str) -> set[str]:
+        try:
+            with open(self._store(key)) as f:
+                return set(f.read().split())
+        except OSError:
+            return set()
+
+    def save_clean(self, key: str, clean: set[str]) -> None:
+        # only remember blobs which are still reachable from the index so
+        # the store does not grow without bound
+        clean = clean & set(self.blob_ids.values())
+        store = self._store(key)
+        os.makedirs(os.path.dirname(store), exist_ok=True)
+        with open(f'{store}.tmp', 'w') as f:
+            f.write(''.join(f'{sha}\n' for sha in sorted(clean)))
+        os.replace(f'{store}.tmp', store)
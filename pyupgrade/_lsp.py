@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import json
+from collections.abc import Callable
+from typing import Any
+from typing import BinaryIO
+
+from pyupgrade._edits import compute_edits
+from pyupgrade._edits import Edit
+from pyupgrade._edits import Position
+from pyupgrade._edits import split_lines
+
+PARSE_ERROR = -32700
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+FIX_ALL = 'source.fixAll.pyupgrade'
+
+
+class ResponseError(Exception):
+    def __init__(self, code: int, message: str) -> None:
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+def read_message(stdin: BinaryIO) -> bytes | None:
+    """read the body of the next message, `None` at end of input"""
+    length = None
+    while True:
+        line = stdin.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.decode('ascii').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+
+    if length is None:
+        raise ResponseError(PARSE_ERROR, 'missing Content-Length header')
+    return stdin.read(length)
+
+
+def write_message(stdout: BinaryIO, msg: dict[str, Any]) -> None:
+    body = json.dumps(msg, separators=(',', ':')).encode()
+    stdout.write(b'Content-Length: %d\r\n\r\n%s' % (len(body), body))
+    stdout.flush()
+
+
+def _utf16_len(s: str) -> int:
+    if s.isascii():
+        return len(s)
+    else:
+        return len(s.encode('UTF-16-LE')) // 2
+
+
+def _code_points(line: str, character: int) -> int:
+    """convert a utf-16 `character` offset into `line` to code points"""
+    line = line.rstrip('\r\n')
+    if line.isascii():
+        return min(character, len(line))
+
+    units = 0
+    for i, c in enumerate(line):
+        if units >= character:
+            return i
+        units += 2 if ord(c) > 0xffff else 1
+    return len(line)
+
+
+def _offset(lines: list[str], position: dict[str, int]) -> int:
+    line = position['line']
+    if line >= len(lines):
+        return sum(len(s) for s in lines)
+    else:
+        before = sum(len(s) for s in lines[:line])
+        return before + _code_points(lines[line], position['character'])
+
+
+def apply_change(text: str, change: dict[str, Any]) -> str:
+    """apply a `TextDocumentContentChangeEvent`"""
+    if 'range' not in change:
+        return change['text']
+
+    lines = split_lines(text)
+    start = _offset(lines, change['range']['start'])
+    end = _offset(lines, change['range']['end'])
+    return text[:start] + change['text'] + text[end:]
+
+
+def _text_edit(lines: list[str], edit: Edit) -> dict[str, Any]:
+    def _utf16(position: Position) -> Position:
+        if position.character:
+            prefix = lines[position.line][:position.character]
+            return position._replace(character=_utf16_len(prefix))
+        else:
+            return position
+
+    start, end = _utf16(edit.start), _utf16(edit.end)
+    return edit._replace(start=start, end=end).to_json()
+
+
+class Server:
+    def __init__(self, fix: Callable[[str], str], stdout: BinaryIO) -> None:
+        self.fix = fix
+        self.stdout = stdout
+        self.documents: dict[str, str] = {}
+        # `TextEdit`s per document, computed lazily and dropped on change
+        self.text_edits: dict[str, list[dict[str, Any]]] = {}
+        self.shutdown = False
+        self.exited = False
+
+        self.requests = {
+            'initialize': self.initialize,
+            'shutdown': self.on_shutdown,
+            'textDocument/formatting': self.formatting,
+            'textDocument/codeAction': self.code_action,
+        }
+        self.notifications = {
+            'exit': self.on_exit,
+            'textDocument/didOpen': self.did_open,
+            'textDocument/didChange': self.did_change,
+            'textDocument/didClose': self.did_close,
+        }
+
+    def initialize(self, params: dict[str, Any]) -> dict[str, Any]:
+        return {
+            'capabilities': {
+                'textDocumentSync': {'openClose': True, 'change': 2},
+                'documentFormattingProvider': True,
+                'codeActionProvider': {'codeActionKinds': [FIX_ALL]},
+            },
+            'serverInfo': {'name': 'pyupgrade'},
+        }
+
+    def on_shutdown(self, params: Any) -> None:
+        self.shutdown = True
+
+    def on_exit(self, params: Any) -> None:
+        self.exited = True
+
+    def did_open(self, params: dict[str, Any]) -> None:
+        doc = params['textDocument']
+        self.documents[doc['uri']] = doc['text']
+        self.text_edits.pop(doc['uri'], None)
+
+    def did_change(self, params: dict[str, Any]) -> None:
+        uri = params['textDocument']['uri']
+        text = self.documents[uri]
+        for change in params['contentChanges']:
+            text = apply_change(text, change)
+        self.documents[uri] = text
+        self.text_edits.pop(uri, None)
+
+    def did_close(self, params: dict[str, Any]) -> None:
+        uri = params['textDocument']['uri']
+        self.documents.pop(uri, None)
+        self.text_edits.pop(uri, None)
+
+    def _text_edits(self, uri: str) -> list[dict[str, Any]]:
+        try:
+            return self.text_edits[uri]
+        except KeyError:
+            pass
+
+        try:
+            text = self.documents[uri]
+        except KeyError:
+            raise ResponseError(INVALID_PARAMS, f'unknown document: {uri}')
+
+        lines = split_lines(text)
+        edits = compute_edits(text, self.fix(text))
+        ret = self.text_edits[uri] = [_text_edit(lines, e) for e in edits]
+        return ret
+
+    def formatting(self, params: dict[str, Any]) -> list[dict[str, Any]]:
+        return self._text_edits(params['textDocument']['uri'])
+
+    def code_action(self, params: dict[str, Any]) -> list[dict[str, Any]]:
+        only = params.get('context', {}).get('only')
+        if only is not None and not any(
+                FIX_ALL == kind or FIX_ALL.startswith(f'{kind}.')
+                for kind in only
+        ):
+            return []
+
+        uri = params['textDocument']['uri']
+        text_edits = self._text_edits(uri)
+        if not text_edits:
+            return []
+        else:
+            return [{
+                'title': 'Upgrade syntax (pyupgrade)',
+                'kind': FIX_ALL,
+                'edit': {'changes': {uri: text_edits}},
+            }]
+
+    def _respond(self, msg_id: Any, **kwargs: Any) -> None:
+        write_message(self.stdout, {'jsonrpc': '2.0', 'id': msg_id, **kwargs})
+
+    def handle(self, body: bytes) -> None:
+        try:
+            msg = json.loads(body)
+        except ValueError:
+            error = {'code': PARSE_ERROR, 'message': 'invalid json'}
+            self._respond(None, error=error)
+            return
+
+        method = msg.get('method')
+        params = msg.get('params')
+        if 'id' not in msg:  # a notification, which never gets a response
+            handler = self.notifications.get(method)
+            try:
+                if handler is not None:
+                    handler(params)
+            except (KeyError, TypeError):
+                pass  # malformed notifications can't be reported, ignore
+            return
+
+        try:
+            request = self.requests.get(method)
+            if request is None:
+                raise ResponseError(METHOD_NOT_FOUND, f'unknown: {method}')
+            result = request(params)
+        except ResponseError as e:
+            error = {'code': e.code, 'message': e.message}
+            self._respond(msg['id'], error=error)
+        except Exception as e:
+            message = f'{type(e).__name__}: {e}'
+            error = {'code': INTERNAL_ERROR, 'message': message}
+            self._respond(msg['id'], error=error)
+        else:
+            self._respond(msg['id'], result=result)
+
+
+def serve(
+        fix: Callable[[str], str],
+        stdin: BinaryIO,
+        stdout: BinaryIO,
+) -> int:
+    """serve the language server protocol until `exit`"""
+    server = Server(fix, stdout)
+    while not server.exited:
+        try:
+            body = read_message(stdin)
+        except ResponseError as e:
+            write_message(stdout, {
+                'jsonrpc': '2.0',
+                'id': None,
+                'error': {'code': e.code, 'message': e.message},
+            })
+            continue
+        if body is None:
+            break
+        server.handle(body)
+
+    # per the spec: exit code 0 only after a `shutdown` request
+    return 0 if server.shutdown else 1
@@ -2,11 +2,24 @@ from __future__ import annotations
 
 import argparse
 import ast
+import concurrent.futures
+import difflib
+import functools
+import io
+import json
+import os
 import re
+import subprocess
 import sys
+import threading
+import time
 import tokenize
+import warnings
+from collections.abc import Callable
 from collections.abc import Sequence
 from re import Match
+from typing import Any
+from typing import TextIO
 
 from tokenize_rt import NON_CODING_TOKENS
 from tokenize_rt import parse_string_literal
@@ -17,17 +30,46 @@ from tokenize_rt import Token
 from tokenize_rt import tokens_to_src
 from tokenize_rt import UNIMPORTANT_WS
 
+from pyupgrade._archive import ArchiveError
+from pyupgrade._archive import is_archive
+from pyupgrade._archive import process as process_archive
 from pyupgrade._ast_helpers import ast_parse
+from pyupgrade._cache import Cache
 from pyupgrade._data import FUNCS
+from pyupgrade._data import iter_callbacks
+from pyupgrade._data import plugin_name
 from pyupgrade._data import Settings
+from pyupgrade._data import settings_key
 from pyupgrade._data import visit
+from pyupgrade._deadline import check_deadline
+from pyupgrade._deadline import deadline
+from pyupgrade._deadline import DeadlineExceeded
+from pyupgrade._edits import compute_edits
+from pyupgrade._git import blob_id
+from pyupgrade._git import cat_blobs
+from pyupgrade._git import GitIndex
+from pyupgrade._git import normpath
+from pyupgrade._git import tree_blobs
+from pyupgrade._lsp import serve
+from pyupgrade._reduce import parse_duration
+from pyupgrade._reduce import reduce
+from pyupgrade._reduce import slower_than
+from pyupgrade._schedule import largest_first
+from pyupgrade._schedule import load_history
+from pyupgrade._schedule import save_history
+from pyupgrade._shard import merge_reports
+from pyupgrade._shard import parse_shard
+from pyupgrade._shard import select
+from pyupgrade._shard import write_results
 from pyupgrade._string_helpers import DotFormatPart
 from pyupgrade._string_helpers import is_codec
 from pyupgrade._string_helpers import parse_format
 from pyupgrade._string_helpers import unparse_parsed_string
+from pyupgrade._token_helpers import block_tree
 from pyupgrade._token_helpers import is_close
 from pyupgrade._token_helpers import is_open
 from pyupgrade._token_helpers import remove_brace
+from pyupgrade._watch import watch
 
 
 def inty(s: str) -> bool:
@@ -53,9 +95,18 @@ def _fixup_dedent_tokens(tokens: list[Token]) -> None:
             tokens[i], tokens[i + 1] = tokens[i + 1], tokens[i]
 
 
-def _fix_plugins(contents_text: str, settings: Settings) -> str:
+def _fix_plugins(
+        contents_text: str,
+        settings: Settings,
+        *,
+        contents_bytes: bytes | None = None,
+) -> str:
+    # the file's original bytes (if any) are parsed as-is to avoid re-encoding
     try:
-        ast_obj = ast_parse(contents_text)
+        if contents_bytes is not None:
+            ast_obj = ast_parse(contents_bytes)
+        else:
+            ast_obj = ast_parse(contents_text)
     except SyntaxError:
         return contents_text
 
@@ -71,13 +122,15 @@ def _fix_plugins(contents_text: str, settings: Settings) -> str:
 
     _fixup_dedent_tokens(tokens)
 
-    for i, token in reversed_enumerate(tokens):
-        if not token.src:
-            continue
-        # though this is a defaultdict, by using `.get()` this function's
-        # self time is almost 50% faster
-        for callback in callbacks.get(token.offset, ()):
-            callback(i, tokens)
+    with block_tree(tokens):
+        for i, token in reversed_enumerate(tokens):
+            check_deadline()
+            if not token.src:
+                continue
+            # though this is a defaultdict, by using `.get()` this function's
+            # self time is almost 50% faster
+            for callback in callbacks.get(token.offset, ()):
+                callback(i, tokens)
 
     return tokens_to_src(tokens).lstrip()
 
@@ -92,12 +145,12 @@ ESCAPE_RE = re.compile(r'\\.', re.DOTALL)
 NAMED_ESCAPE_NAME = re.compile(r'\{[^}]+\}')
 
 
-def _fix_escape_sequences(token: Token) -> Token:
-    prefix, rest = parse_string_literal(token.src)
+def _fix_escape_sequences(src: str) -> str:
+    prefix, rest = parse_string_literal(src)
     actual_prefix = prefix.lower()
 
     if 'r' in actual_prefix or '\\' not in rest:
-        return token
+        return src
 
     is_bytestring = 'b' in actual_prefix
 
@@ -129,20 +182,30 @@ def _fix_escape_sequences(token: Token) -> Token:
             return fr'\{matched}'
 
     if has_invalid_escapes and (has_valid_escapes or 'u' in actual_prefix):
-        return token._replace(src=prefix + ESCAPE_RE.sub(cb, rest))
+        return prefix + ESCAPE_RE.sub(cb, rest)
     elif has_invalid_escapes and not has_valid_escapes:
-        return token._replace(src=prefix + 'r' + rest)
+        return prefix + 'r' + rest
     else:
-        return token
+        return src
 
 
-def _remove_u_prefix(token: Token) -> Token:
-    prefix, rest = parse_string_literal(token.src)
+def _remove_u_prefix(src: str) -> str:
+    prefix, rest = parse_string_literal(src)
     if 'u' not in prefix.lower():
-        return token
+        return src
     else:
         new_prefix = prefix.replace('u', '').replace('U', '')
-        return token._replace(src=new_prefix + rest)
+        return new_prefix + rest
+
+
+# string literals repeat a lot (log messages, dict keys, ...) so the
+# token-level literal rewrites are memoized for the whole run
+_LITERAL_CACHE_SIZE = 8192
+
+
+@functools.lru_cache(maxsize=_LITERAL_CACHE_SIZE)
+def _fix_string_literal(src: str) -> str:
+    return _fix_escape_sequences(_remove_u_prefix(src))
 
 
 def _fix_extraneous_parens(tokens: list[Token], i: int) -> None:
@@ -188,38 +251,107 @@ def _remove_fmt(tup: DotFormatPart) -> DotFormatPart:
         return (tup[0], '', tup[2], tup[3])
 
 
+@functools.lru_cache(maxsize=_LITERAL_CACHE_SIZE)
+def _format_literal_keys(src: str) -> tuple[tuple[int, ...], str] | None:
+    """the positional keys of a format literal and the literal without them
+
+    returns `None` if the literal can't be renumbered
+    """
+    # f'foo {0}'.format(...) would get turned into a SyntaxError
+    prefix, _ = parse_string_literal(src)
+    if 'f' in prefix.lower():  # pragma: <3.12 cover
+        return None
+
+    try:
+        parsed = parse_format(src)
+    except ValueError:
+        # the format literal was malformed, skip it
+        return None
+
+    # The last segment will always be the end of the string and not a
+    # format, slice avoids the `None` format key
+    keys = []
+    for _, fmtkey, spec, _ in parsed[:-1]:
+        if (
+                fmtkey is not None and inty(fmtkey) and
+                spec is not None and '{' not in spec
+        ):
+            keys.append(int(fmtkey))
+        else:
+            return None
+
+    return tuple(keys), unparse_parsed_string([_remove_fmt(t) for t in parsed])
+
+
 def _fix_format_literal(tokens: list[Token], end: int) -> None:
     parts = rfind_string_parts(tokens, end)
-    parsed_parts = []
+    new_srcs = []
     last_int = -1
     for i in parts:
-        # f'foo {0}'.format(...) would get turned into a SyntaxError
-        prefix, _ = parse_string_literal(tokens[i].src)
-        if 'f' in prefix.lower():  # pragma: <3.12 cover
+        ret = _format_literal_keys(tokens[i].src)
+        if ret is None:
             return
-
-        try:
-            parsed = parse_format(tokens[i].src)
-        except ValueError:
-            # the format literal was malformed, skip it
+        keys, new_src = ret
+        if keys != tuple(range(last_int + 1, last_int + 1 + len(keys))):
             return
+        last_int += len(keys)
+        new_srcs.append(new_src)
 
-        # The last segment will always be the end of the string and not a
-        # format, slice avoids the `None` format key
-        for _, fmtkey, spec, _ in parsed[:-1]:
-            if (
-                    fmtkey is not None and inty(fmtkey) and
-                    int(fmtkey) == last_int + 1 and
-                    spec is not None and '{' not in spec
-            ):
-                last_int += 1
-            else:
-                return
+    for i, new_src in zip(parts, new_srcs):
+        tokens[i] = tokens[i]._replace(src=new_src)
+
+
+@functools.lru_cache(maxsize=_LITERAL_CACHE_SIZE)
+def _encoding_latin1_ok(src: str) -> bool | None:
+    """whether `.encode(src)` allows `\\x` escapes, `None` if unsupported"""
+    prefix, rest = parse_string_literal(src)
+    if 'f' in prefix.lower():  # pragma: <3.12 cover
+        return None
+    encoding = ast.literal_eval(prefix + rest)
+    if is_codec(encoding, 'ascii') or is_codec(encoding, 'utf-8'):
+        return False
+    elif is_codec(encoding, 'iso8859-1'):
+        return True
+    else:
+        return None
+
+
+@functools.lru_cache(maxsize=_LITERAL_CACHE_SIZE)
+def _binary_literal(src: str, latin1_ok: bool) -> str | None:
+    prefix, rest = parse_string_literal(src)
+    escapes = set(ESCAPE_RE.findall(rest))
+    if (
+            not rest.isascii() or
+            '\\u' in escapes or
+            '\\U' in escapes or
+            '\\N' in escapes or
+            ('\\x' in escapes and not latin1_ok) or
+            'f' in prefix.lower()
+    ):
+        return None
+    else:
+        return 'b' + prefix.replace('u', '').replace('U', '') + rest
 
-        parsed_parts.append([_remove_fmt(tup) for tup in parsed])
 
-    for i, parsed in zip(parts, parsed_parts):
-        tokens[i] = tokens[i]._replace(src=unparse_parsed_string(parsed))
+_LITERAL_CACHES = (
+    _fix_string_literal,
+    _format_literal_keys,
+    _encoding_latin1_ok,
+    _binary_literal,
+)
+
+
+def _literal_cache_stats() -> str:
+    hits = misses = 0
+    for func in _LITERAL_CACHES:
+        info = func.cache_info()
+        hits += info.hits
+        misses += info.misses
+    rate = hits / (hits + misses) if hits + misses else 0.
+    return (
+        f'string literal cache: {hits} hits, {misses} misses '
+        f'({rate:.1%} hit rate)'
+    )
 
 
 def _fix_encode_to_binary(tokens: list[Token], i: int) -> None:
@@ -234,7 +366,7 @@ def _fix_encode_to_binary(tokens: list[Token], i: int) -> None:
             tokens[i + 2].src == ')'
     ):
         victims = slice(i - 1, i + 3)
-        latin1_ok = False
+        latin1_ok: bool | None = False
     # .encode('encoding')
     elif (
             i + 3 < len(tokens) and
@@ -243,36 +375,21 @@ def _fix_encode_to_binary(tokens: list[Token], i: int) -> None:
             tokens[i + 3].src == ')'
     ):
         victims = slice(i - 1, i + 4)
-        prefix, rest = parse_string_literal(tokens[i + 2].src)
-        if 'f' in prefix.lower():  # pragma: <3.12 cover
-            return
-        encoding = ast.literal_eval(prefix + rest)
-        if is_codec(encoding, 'ascii') or is_codec(encoding, 'utf-8'):
-            latin1_ok = False
-        elif is_codec(encoding, 'iso8859-1'):
-            latin1_ok = True
-        else:
+        latin1_ok = _encoding_latin1_ok(tokens[i + 2].src)
+        if latin1_ok is None:
             return
     else:
         return
 
+    new_srcs = []
     for part in parts:
-        prefix, rest = parse_string_literal(tokens[part].src)
-        escapes = set(ESCAPE_RE.findall(rest))
-        if (
-                not rest.isascii() or
-                '\\u' in escapes or
-                '\\U' in escapes or
-                '\\N' in escapes or
-                ('\\x' in escapes and not latin1_ok) or
-                'f' in prefix.lower()
-        ):
+        new_src = _binary_literal(tokens[part].src, latin1_ok)
+        if new_src is None:
             return
+        new_srcs.append(new_src)
 
-    for part in parts:
-        prefix, rest = parse_string_literal(tokens[part].src)
-        prefix = 'b' + prefix.replace('u', '').replace('U', '')
-        tokens[part] = tokens[part]._replace(src=prefix + rest)
+    for part, new_src in zip(parts, new_srcs):
+        tokens[part] = tokens[part]._replace(src=new_src)
     del tokens[victims]
 
 
@@ -286,8 +403,11 @@ def _fix_tokens(contents_text: str) -> str:
     except tokenize.TokenError:
         return contents_text
     for i, token in reversed_enumerate(tokens):
+        check_deadline()
         if token.name == 'STRING':
-            tokens[i] = _fix_escape_sequences(_remove_u_prefix(tokens[i]))
+            new_src = _fix_string_literal(token.src)
+            if new_src != token.src:
+                tokens[i] = token._replace(src=new_src)
         elif token.matches(name='OP', src='('):
             _fix_extraneous_parens(tokens, i)
         elif token.src == 'format' and i > 0 and tokens[i - 1].src == '.':
@@ -306,47 +426,490 @@ def _fix_tokens(contents_text: str) -> str:
     return tokens_to_src(tokens).lstrip()
 
 
-def _fix_file(filename: str, args: argparse.Namespace) -> int:
+def _fix_contents(
+        contents_text: str,
+        settings: Settings,
+        *,
+        contents_bytes: bytes | None = None,
+) -> str:
+    contents_text = _fix_plugins(
+        contents_text, settings=settings, contents_bytes=contents_bytes,
+    )
+    return _fix_tokens(contents_text)
+
+
+def _diff(filename: str, before: str, after: str) -> str:
+    def _lines(s: str) -> list[str]:
+        lines = s.splitlines(True)
+        if lines and not lines[-1].endswith(('\n', '\r')):
+            lines[-1] += '\n\\ No newline at end of file\n'
+        return lines
+
+    diff = difflib.unified_diff(
+        _lines(before), _lines(after),
+        fromfile=f'a/{filename}', tofile=f'b/{filename}',
+    )
+    return ''.join(diff)
+
+
+def _settings(args: argparse.Namespace) -> Settings:
+    return Settings(
+        min_version=args.min_version,
+        keep_percent_format=args.keep_percent_format,
+        keep_mock=args.keep_mock,
+        keep_runtime_typing=args.keep_runtime_typing,
+    )
+
+
+VERSIONS = (
+    (3,), (3, 6), (3, 7), (3, 8), (3, 9), (3, 10),
+    (3, 11), (3, 12), (3, 13), (3, 14), (3, 15),
+)
+
+
+def _target_name(version: tuple[int, ...]) -> str:
+    return f'py{"".join(str(part) for part in version)}-plus'
+
+
+def _read(filename: str) -> bytes:
     if filename == '-':
-        contents_bytes = sys.stdin.buffer.read()
+        return sys.stdin.buffer.read()
     else:
         with open(filename, 'rb') as fb:
-            contents_bytes = fb.read()
+            return fb.read()
+
+
+def _read_files_from(filename: str) -> list[str]:
+    contents = os.fsdecode(_read(filename))
+    return [part for part in contents.split('\0') if part]
+
+
+def _is_utf8(contents_bytes: bytes) -> bool:
+    # pure ascii is valid utf-8 and much cheaper to check than decoding
+    if contents_bytes.isascii():
+        return True
+    try:
+        contents_bytes.decode()
+    except UnicodeDecodeError:
+        return False
+    else:
+        return True
+
+
+def _findings(
+        ast_obj: ast.Module,
+        settings: Settings,
+) -> list[tuple[int, int, str]]:
+    return sorted({
+        (offset.line, offset.utf8_byte_offset, plugin_name(ast_func))
+        for ast_func, offset, _ in iter_callbacks(FUNCS, ast_obj, settings)
+    })
+
+
+SKIPPED_SIZE = 'larger than --max-file-bytes'
+SKIPPED_TIMEOUT = 'took longer than --per-file-timeout'
+
+
+def _too_large(contents_bytes: bytes, args: argparse.Namespace) -> bool:
+    return (
+        args.max_file_bytes is not None and
+        len(contents_bytes) > args.max_file_bytes
+    )
+
+
+def _skip(
+        skipped: list[tuple[str, str]] | None,
+        filename: str,
+        reason: str,
+) -> None:
+    if skipped is not None:
+        skipped.append((filename, reason))
+
+
+def _print_skipped(skipped: list[tuple[str, str]]) -> None:
+    for reason in (SKIPPED_SIZE, SKIPPED_TIMEOUT):
+        filenames = sorted(f for f, r in skipped if r == reason)
+        if filenames:
+            print(
+                f'skipped {len(filenames)} file(s) {reason}:',
+                file=sys.stderr,
+            )
+            for filename in filenames:
+                print(f'  {filename}', file=sys.stderr)
+
+
+def _blob_ids(filenames: list[str]) -> dict[str, str]:
+    ret = {}
+    for filename in filenames:
+        if filename == '-':
+            continue
+        try:
+            ret[filename] = blob_id(_read(filename))
+        except OSError:
+            continue  # reported when the file is processed
+    return ret
+
+
+def _report_file(
+        filename: str,
+        args: argparse.Namespace,
+        *,
+        stdout: TextIO | None = None,
+        stderr: TextIO | None = None,
+        skipped: list[tuple[str, str]] | None = None,
+) -> int:
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+
+    if is_archive(filename):
+        print(f'{filename}: --report does not support archives', file=stderr)
+        return 1
+
+    contents_bytes = _read(filename)
+    if _too_large(contents_bytes, args):
+        _skip(skipped, filename, SKIPPED_SIZE)
+        return 0
+    elif not _is_utf8(contents_bytes):
+        print(f'{filename} is non-utf-8 (not supported)', file=stderr)
+        return 1
+
+    settings = _settings(args)
+    try:
+        with deadline(args.per_file_timeout):
+            try:
+                ast_obj = ast_parse(contents_bytes)
+            except SyntaxError:
+                return 0
+
+            if args.report == 'targets':
+                # parse once and evaluate every target against the same tree
+                counts = {
+                    _target_name(version): len(
+                        _findings(
+                            ast_obj, settings._replace(min_version=version),
+                        ),
+                    )
+                    for version in VERSIONS
+                }
+            else:
+                findings = _findings(ast_obj, settings)
+    except DeadlineExceeded:
+        _skip(skipped, filename, SKIPPED_TIMEOUT)
+        return 0
+
+    if args.report == 'targets':
+        result = {'filename': filename, 'counts': counts}
+        print(json.dumps(result), file=stdout)
+        found = counts[_target_name(settings.min_version)] > 0
+    else:
+        for line, col, plugin in findings:
+            finding = {'filename': filename, 'line': line, 'col': col}
+            print(json.dumps({**finding, 'plugin': plugin}), file=stdout)
+        found = bool(findings)
+
+    if args.exit_zero_even_if_changed:
+        return 0
+    else:
+        return found
+
+
+class Results:
+    """fixed contents shared by files with identical bytes in one run
+
+    the first file to ask computes the result, the rest (possibly on other
+    threads) wait for it
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._futures: dict[
+            tuple[str, Settings],
+            concurrent.futures.Future[str],
+        ] = {}
+        self._computed: dict[tuple[str, Settings], str] = {}
+        self.hits = 0
+
+    def preload(self, key: tuple[str, Settings], contents: str) -> None:
+        """provide a result computed previously (eg by `--cache`)"""
+        future: concurrent.futures.Future[str] = concurrent.futures.Future()
+        future.set_result(contents)
+        with self._lock:
+            self._futures[key] = future
+
+    def computed(self) -> dict[tuple[str, Settings], str]:
+        """the results computed (rather than preloaded) in this run"""
+        with self._lock:
+            return dict(self._computed)
+
+    def get(
+            self,
+            key: tuple[str, Settings],
+            compute: Callable[[], str],
+    ) -> str:
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                self.hits += 1
+                owner = False
+            else:
+                future = self._futures[key] = concurrent.futures.Future()
+                owner = True
+
+        if owner:
+            try:
+                ret = compute()
+            except BaseException as e:
+                # files with the same contents fail the same way
+                future.set_exception(e)
+                raise
+            else:
+                with self._lock:
+                    self._computed[key] = ret
+                future.set_result(ret)
+        return future.result()
+
+
+def _fix_file(
+        filename: str,
+        args: argparse.Namespace,
+        *,
+        clean: set[str] | None = None,
+        stdout: TextIO | None = None,
+        stderr: TextIO | None = None,
+        skipped: list[tuple[str, str]] | None = None,
+        results: Results | None = None,
+        contents: bytes | None = None,
+        rewrite: Callable[[str], None] | None = None,
+) -> int:
+    stdout = stdout or sys.stdout
+    stderr = stderr or sys.stderr
+
+    if contents is None and is_archive(filename):
+        return _fix_archive(
+            filename,
+            args,
+            clean=clean,
+            stdout=stdout,
+            stderr=stderr,
+            skipped=skipped,
+            results=results,
+        )
+
+    contents_bytes = _read(filename) if contents is None else contents
+    if _too_large(contents_bytes, args):
+        _skip(skipped, filename, SKIPPED_SIZE)
+        return 0
 
     try:
         contents_text_orig = contents_text = contents_bytes.decode()
     except UnicodeDecodeError:
-        print(f'{filename} is non-utf-8 (not supported)')
+        # keep the patch / json lines printed by --diff / --edits usable
+        file = stderr if args.diff or args.edits else stdout
+        print(f'{filename} is non-utf-8 (not supported)', file=file)
         return 1
 
-    contents_text = _fix_plugins(
-        contents_text,
-        settings=Settings(
-            min_version=args.min_version,
-            keep_percent_format=args.keep_percent_format,
-            keep_mock=args.keep_mock,
-            keep_runtime_typing=args.keep_runtime_typing,
-        ),
-    )
-    contents_text = _fix_tokens(contents_text)
+    settings = _settings(args)
 
-    if filename == '-':
-        print(contents_text, end='')
-    elif contents_text != contents_text_orig:
-        print(f'Rewriting {filename}', file=sys.stderr)
-        with open(filename, 'w', encoding='UTF-8', newline='') as f:
-            f.write(contents_text)
+    def _fix() -> str:
+        with deadline(args.per_file_timeout):
+            return _fix_contents(
+                contents_text, settings, contents_bytes=contents_bytes,
+            )
+
+    try:
+        if results is None:
+            contents_text = _fix()
+        else:
+            key = (blob_id(contents_bytes), settings)
+            contents_text = results.get(key, _fix)
+    except DeadlineExceeded:
+        _skip(skipped, filename, SKIPPED_TIMEOUT)
+        return 0
+
+    changed = contents_text != contents_text_orig
+    if args.edits:
+        if changed or filename == '-':
+            edits = compute_edits(contents_text_orig, contents_text)
+            edits_json = [edit.to_json() for edit in edits]
+            result = {'filename': filename, 'edits': edits_json}
+            print(json.dumps(result), file=stdout)
+    elif args.diff:
+        if changed:
+            diff = _diff(filename, contents_text_orig, contents_text)
+            print(diff, end='', file=stdout)
+    elif args.check:
+        if changed:
+            print(f'Would rewrite {filename}', file=stderr)
+    elif filename == '-':
+        print(contents_text, end='', file=stdout)
+    elif changed:
+        print(f'Rewriting {filename}', file=stderr)
+        if rewrite is not None:
+            rewrite(contents_text)
+        else:
+            with open(filename, 'w', encoding='UTF-8', newline='') as f:
+                f.write(contents_text)
+
+    if not changed and clean is not None:
+        clean.add(blob_id(contents_bytes))
 
     if args.exit_zero_even_if_changed:
         return 0
     else:
-        return contents_text != contents_text_orig
+        return changed
 
 
-def main(argv: Sequence[str] | None = None) -> int:
-    parser = argparse.ArgumentParser()
-    parser.add_argument('filenames', nargs='*')
-    parser.add_argument('--exit-zero-even-if-changed', action='store_true')
+def _fix_archive(
+        filename: str,
+        args: argparse.Namespace,
+        *,
+        clean: set[str] | None,
+        stdout: TextIO,
+        stderr: TextIO,
+        skipped: list[tuple[str, str]] | None,
+        results: Results | None,
+) -> int:
+    """fix the `.py` members of an archive, named `archive/member`"""
+    ret = 0
+
+    def _fix_member(member: str, contents_bytes: bytes) -> bytes | None:
+        nonlocal ret
+        rewritten: list[str] = []
+        ret |= _fix_file(
+            f'{filename}/{member}',
+            args,
+            clean=clean,
+            stdout=stdout,
+            stderr=stderr,
+            skipped=skipped,
+            results=results,
+            contents=contents_bytes,
+            rewrite=rewritten.append,
+        )
+        return rewritten[0].encode() if rewritten else None
+
+    write = not (args.check or args.diff or args.edits)
+    try:
+        process_archive(filename, _fix_member, write=write)
+    except ArchiveError as e:
+        print(f'{filename}: not a valid archive ({e})', file=stderr)
+        return 1
+    return ret
+
+
+def _fix_git_rev(args: argparse.Namespace, pathspecs: list[str]) -> int:
+    """fix the python files of a revision without checking it out"""
+    try:
+        blobs = tree_blobs(args.git_rev, pathspecs)
+    except subprocess.CalledProcessError as e:
+        msg = e.stderr.decode().strip()
+        print(f'--git-rev: {msg}', file=sys.stderr)
+        return 1
+
+    # files with identical contents are read (and fixed) once
+    paths: dict[str, list[str]] = {}
+    for path, sha in blobs:
+        paths.setdefault(sha, []).append(path)
+
+    # there is no working tree to write to, print a patch by default
+    if not (args.check or args.edits):
+        args.diff = True
+
+    skipped: list[tuple[str, str]] = []
+    results = Results()
+    ret = 0
+    for sha, contents in cat_blobs(list(paths)):
+        for path in paths[sha]:
+            ret |= _fix_file(
+                path,
+                args,
+                skipped=skipped,
+                results=results,
+                contents=contents,
+            )
+        if ret and args.fail_fast:
+            break
+
+    _print_skipped(skipped)
+    return ret
+
+
+def _timed(
+        func: Callable[..., int],
+        filename: str,
+        durations: dict[str, float] | None,
+        **kwargs: Any,
+) -> int:
+    """run `func`, recording its duration unless `durations` is `None`"""
+    t0 = time.monotonic()
+    ret = func(filename, **kwargs)
+    # normpath stats every path component so only pay for it with --history
+    if durations is not None and filename != '-':
+        durations[normpath(filename)] = time.monotonic() - t0
+    return ret
+
+
+def _capture(
+        func: Callable[..., int],
+        filename: str,
+        durations: dict[str, float] | None,
+) -> tuple[int, str, str]:
+    stdout, stderr = io.StringIO(), io.StringIO()
+    ret = _timed(func, filename, durations, stdout=stdout, stderr=stderr)
+    return ret, stdout.getvalue(), stderr.getvalue()
+
+
+def _run_jobs(
+        func: Callable[..., int],
+        filenames: list[str],
+        *,
+        jobs: int,
+        fail_fast: bool,
+        history: dict[str, float],
+        durations: dict[str, float] | None,
+        failed: list[str],
+) -> int:
+    """run `func` for each file on a thread pool
+
+    the most expensive files (by `history` or size) are started first so a
+    big file picked up last doesn't hold up the whole run.  idle threads
+    take the next file from the shared queue.  output is buffered per file
+    and printed in the order of `filenames`
+    """
+    ret = 0
+    with (
+            # set once for all threads, rather than swapped for each parse
+            warnings.catch_warnings(),
+            concurrent.futures.ThreadPoolExecutor(jobs) as executor,
+    ):
+        warnings.simplefilter('ignore')
+        futures = {
+            i: executor.submit(_capture, func, filenames[i], durations)
+            for i in largest_first(filenames, history)
+        }
+        if fail_fast:
+            # stop at the first failure in completion order, not argument
+            # order: the first argument may well be the last to run
+            for future in concurrent.futures.as_completed(futures.values()):
+                if not future.cancelled() and future.result()[0]:
+                    # files which are already being processed still finish
+                    for other in futures.values():
+                        other.cancel()
+                    break
+
+        for i in range(len(filenames)):
+            if futures[i].cancelled():
+                continue
+            file_ret, out, err = futures[i].result()
+            sys.stdout.write(out)
+            sys.stderr.write(err)
+            ret |= file_ret
+            if file_ret:
+                failed.append(filenames[i])
+    return ret
+
+
+def _add_settings_arguments(parser: argparse.ArgumentParser) -> None:
     parser.add_argument('--keep-percent-format', action='store_true')
     parser.add_argument('--keep-mock', action='store_true')
     parser.add_argument('--keep-runtime-typing', action='store_true')
@@ -354,51 +917,354 @@ def main(argv: Sequence[str] | None = None) -> int:
         '--py3-plus', '--py3-only',
         action='store_const', dest='min_version', default=(3,), const=(3,),
     )
+    for version in VERSIONS[1:]:
+        parser.add_argument(
+            f'--{_target_name(version)}',
+            action='store_const', dest='min_version', const=version,
+        )
+
+
+def reduce_main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='pyupgrade-reduce',
+        description=(
+            'shrink a file which is slow to process to a small reproducer '
+            'which is still slow (eg for a bug report)'
+        ),
+    )
+    parser.add_argument('filename')
+    parser.add_argument(
+        '--slower-than', type=parse_duration, required=True,
+        metavar='DURATION',
+        help='the time (eg `2s` or `500ms`) the reproducer must exceed',
+    )
+    parser.add_argument(
+        '--output', '-o', metavar='FILE',
+        help='write the reproducer to FILE instead of stdout',
+    )
+    _add_settings_arguments(parser)
+    args = parser.parse_args(argv)
+
+    settings = _settings(args)
+    is_slow = slower_than(
+        functools.partial(_fix_contents, settings=settings),
+        args.slower_than,
+    )
+
+    contents = _read(args.filename)
+    if not is_slow(contents):
+        print(
+            f'{args.filename}: not slower than {args.slower_than}s',
+            file=sys.stderr,
+        )
+        return 1
+
+    reduced = reduce(contents, is_slow)
+    print(
+        f'reduced {args.filename} from {len(contents)} to '
+        f'{len(reduced)} bytes',
+        file=sys.stderr,
+    )
+    if args.output is not None:
+        with open(args.output, 'wb') as f:
+            f.write(reduced)
+    else:
+        sys.stdout.buffer.write(reduced)
+        sys.stdout.flush()
+    return 0
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(fromfile_prefix_chars='@')
+    parser.add_argument('filenames', nargs='*')
+    parser.add_argument(
+        '--files-from', metavar='FILE',
+        help=(
+            'also process the NUL-separated filenames listed in FILE '
+            '(`-` for stdin).  arguments may also be read from a response '
+            'file, one per line, with `@FILE`'
+        ),
+    )
+    parser.add_argument('--exit-zero-even-if-changed', action='store_true')
+    _add_settings_arguments(parser)
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        '--check', action='store_true',
+        help='do not write files, only report which would be rewritten',
+    )
+    output.add_argument(
+        '--diff', action='store_true',
+        help='do not write files, print a unified diff of the changes',
+    )
+    output.add_argument(
+        '--edits', action='store_true',
+        help=(
+            'do not write files, print the changes as json lines of '
+            'language server protocol `TextEdit`s'
+        ),
+    )
+    parser.add_argument(
+        '--report', choices=('json', 'targets'),
+        help=(
+            'do not rewrite, print where each plugin would apply as json '
+            'lines (token-based fixes are not reported).  `targets` '
+            'instead prints the number of findings for every --pyXX-plus '
+            'target'
+        ),
+    )
+    parser.add_argument(
+        '--fail-fast', action='store_true',
+        help='stop after the first file which needs changes',
+    )
     parser.add_argument(
-        '--py36-plus',
-        action='store_const', dest='min_version', const=(3, 6),
+        '--jobs', '-j', type=int, default=1, metavar='N',
+        help='process files on N threads (default: %(default)s)',
     )
     parser.add_argument(
-        '--py37-plus',
-        action='store_const', dest='min_version', const=(3, 7),
+        '--cache', metavar='FILE',
+        help=(
+            'remember results in the sqlite database FILE and reuse them '
+            'for files with the same contents and settings.  see also '
+            '`pyupgrade-cache --help`'
+        ),
     )
     parser.add_argument(
-        '--py38-plus',
-        action='store_const', dest='min_version', const=(3, 8),
+        '--history', metavar='FILE',
+        help=(
+            'record how long each file took in FILE and use it to start '
+            'the slowest files first with --jobs'
+        ),
     )
     parser.add_argument(
-        '--py39-plus',
-        action='store_const', dest='min_version', const=(3, 9),
+        '--max-file-bytes', type=int, metavar='N',
+        help='skip (and list at the end) files larger than N bytes',
     )
     parser.add_argument(
-        '--py310-plus',
-        action='store_const', dest='min_version', const=(3, 10),
+        '--per-file-timeout', type=float, metavar='SECONDS',
+        help=(
+            'give up on (and list at the end) files which take longer than '
+            'SECONDS to process, leaving them untouched'
+        ),
     )
     parser.add_argument(
-        '--py311-plus',
-        action='store_const', dest='min_version', const=(3, 11),
+        '--shard', type=parse_shard, metavar='K/N',
+        help=(
+            'only process the K-th (starting at 1) of N disjoint parts of '
+            'the files, chosen by a stable hash of each path.  every shard '
+            'must be given the same files'
+        ),
     )
     parser.add_argument(
-        '--py312-plus',
-        action='store_const', dest='min_version', const=(3, 12),
+        '--shard-by-size', action='store_true',
+        help=(
+            'with --shard, split the files so the parts have similar '
+            'total sizes instead'
+        ),
+    )
+    parser.add_argument(
+        '--results-json', metavar='FILE',
+        help='write the exit status and the files needing changes to FILE',
+    )
+    parser.add_argument(
+        '--merge-reports', nargs='+', metavar='FILE',
+        help=(
+            'combine the --results-json files of all shards, print the '
+            'overall result and exit with the overall status'
+        ),
+    )
+    parser.add_argument(
+        '--git-rev', metavar='REV',
+        help=(
+            'process the python files of the tree of REV (limited to the '
+            'given paths, if any) straight from the object database and '
+            'print a patch of the changes'
+        ),
+    )
+    parser.add_argument(
+        '--git-index-cache', action='store_true',
+        help=(
+            'skip tracked files whose index blob was previously found to '
+            'need no changes with the same settings'
+        ),
+    )
+    parser.add_argument(
+        '--watch', metavar='DIR',
+        help=(
+            'process the python files under DIR, then keep polling and '
+            'reprocess files as they change'
+        ),
     )
     parser.add_argument(
-        '--py313-plus',
-        action='store_const', dest='min_version', const=(3, 13),
+        '--watch-interval', type=float, default=.25, metavar='SECONDS',
+        help='how often --watch polls for changes (default: %(default)s)',
     )
     parser.add_argument(
-        '--py314-plus',
-        action='store_const', dest='min_version', const=(3, 14),
+        '--lsp', action='store_true',
+        help='run a language server on stdin / stdout',
     )
     parser.add_argument(
-        '--py315-plus',
-        action='store_const', dest='min_version', const=(3, 15),
+        '--stats', action='store_true',
+        help='print cache statistics to stderr when done',
     )
     args = parser.parse_args(argv)
 
+    if args.jobs < 1:
+        parser.error('--jobs must be at least 1')
+    if args.shard_by_size and args.shard is None:
+        parser.error('--shard-by-size requires --shard')
+
+    if args.merge_reports is not None:
+        if args.filenames:
+            parser.error('--merge-reports cannot be combined with filenames')
+        return merge_reports(args.merge_reports)
+
+    filenames = args.filenames
+    if args.files_from is not None:
+        if args.files_from == '-' and '-' in filenames:
+            parser.error('cannot read both --files-from and a file from stdin')
+        filenames = [*filenames, *_read_files_from(args.files_from)]
+    if args.lsp:
+        if filenames:
+            parser.error('--lsp cannot be combined with filenames')
+        fix = functools.partial(_fix_contents, settings=_settings(args))
+        return serve(fix, sys.stdin.buffer, sys.stdout.buffer)
+
+    if args.watch is not None:
+        if filenames:
+            parser.error('--watch cannot be combined with filenames')
+        if args.report:
+            func = functools.partial(_report_file, args=args)
+        else:
+            func = functools.partial(_fix_file, args=args)
+        try:
+            watch(args.watch, func, interval=args.watch_interval)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.git_rev is not None:
+        if args.report:
+            parser.error('--git-rev cannot be combined with --report')
+        return _fix_git_rev(args, filenames)
+
+    if args.shard is not None:
+        # before anything filters the list so all shards agree on it
+        filenames = select(filenames, args.shard, by_size=args.shard_by_size)
+    processed = filenames
+
+    index = None
+    clean: set[str] | None = None
+    if args.git_index_cache:
+        try:
+            index = GitIndex.read()
+        except (OSError, subprocess.CalledProcessError):
+            print(
+                '--git-index-cache: not a git repository, ignoring',
+                file=sys.stderr,
+            )
+        else:
+            key = settings_key(_settings(args))
+            clean = index.load_clean(key)
+            filenames = [
+                filename for filename in filenames
+                if index.lookup(filename) not in clean
+            ]
+
+    skipped: list[tuple[str, str]] = []
+    results = Results()
+
+    cache = None
+    if args.cache is not None and not args.report:
+        settings = _settings(args)
+        cache_key = settings_key(settings)
+        cache = Cache(args.cache)
+        if clean is None:
+            clean = set()
+
+        blobs = _blob_ids(filenames)
+        found = cache.lookup(cache_key, set(blobs.values()))
+        for blob, fixed in found.items():
+            if fixed is not None:
+                results.preload((blob, settings), fixed.decode())
+        # files known to be clean don't need to be looked at again
+        filenames = [
+            filename for filename in filenames
+            if filename not in blobs or
+            blobs[filename] not in found or
+            found[blobs[filename]] is not None
+        ]
+    if args.report:
+        func = functools.partial(_report_file, args=args, skipped=skipped)
+    else:
+        func = functools.partial(
+            _fix_file,
+            args=args,
+            clean=clean,
+            skipped=skipped,
+            results=results,
+        )
+
+    durations: dict[str, float] | None
+    if args.history is not None:
+        history = load_history(args.history)
+        durations = {}
+    else:
+        history = {}
+        durations = None
+
     ret = 0
-    for filename in args.filenames:
-        ret |= _fix_file(filename, args)
+    failed: list[str] = []
+    if args.jobs > 1:
+        ret = _run_jobs(
+            func,
+            filenames,
+            jobs=args.jobs,
+            fail_fast=args.fail_fast,
+            history=history,
+            durations=durations,
+            failed=failed,
+        )
+    else:
+        for filename in filenames:
+            file_ret = _timed(func, filename, durations)
+            ret |= file_ret
+            if file_ret:
+                failed.append(filename)
+            if ret and args.fail_fast:
+                break
+
+    if durations is not None:
+        save_history(args.history, history, durations)
+
+    if cache is not None and clean is not None:
+        entries: dict[str, bytes | None] = dict.fromkeys(clean)
+        for (blob, _), contents_text in results.computed().items():
+            if blob not in clean:
+                entries[blob] = contents_text.encode()
+        cache.store(cache_key, entries)
+        cache.close()
+
+    if index is not None and clean is not None:
+        index.save_clean(key, clean)
+
+    _print_skipped(skipped)
+
+    if args.results_json is not None:
+        write_results(
+            args.results_json,
+            shard=args.shard,
+            returncode=ret,
+            files=processed,
+            failed=failed,
+        )
+
+    if args.stats:
+        print(_literal_cache_stats(), file=sys.stderr)
+        print(
+            f'identical contents: {results.hits} file(s) reused a result',
+            file=sys.stderr,
+        )
+
     return ret
 
 
@@ -332,7 +332,7 @@ def _for_version(
             'mock.mock': 'unittest.mock',
         })
 
-    return removals, exact, mods
+    return dict(removals), exact, mods
 
 
 def _remove_import(i: int, tokens: list[Token]) -> None:
@@ -464,12 +464,7 @@ def _replace_from_mixed(
         parsed.remove_parts(tokens, removal_idxs)
 
 
-@register(ast.ImportFrom)
-def visit_ImportFrom(
-        state: State,
-        node: ast.ImportFrom,
-        parent: ast.AST,
-) -> Iterable[tuple[Offset, TokenFunc]]:
+def _import_from_func(state: State, node: ast.ImportFrom) -> TokenFunc | None:
     removals, exact, mods = _for_version(
         state.settings.min_version,
         keep_mock=state.settings.keep_mock,
@@ -477,7 +472,7 @@ def visit_ImportFrom(
 
     # we don't have any relative rewrites
     if node.level != 0 or node.module is None:
-        return
+        return None
 
     mod = node.module
 
@@ -504,25 +499,24 @@ def visit_ImportFrom(
             module_moves.append((i, new_mod, alias))
 
     if len(removal_idxs) == len(node.names):
-        yield ast_to_offset(node), _remove_import
+        return _remove_import
     elif (
             len(exact_moves) == len(node.names) and
             len({mod for _, mod, _ in exact_moves}) == 1
     ):
         _, modname, _ = exact_moves[0]
-        func = functools.partial(_replace_from_modname, modname=modname)
-        yield ast_to_offset(node), func
+        return functools.partial(_replace_from_modname, modname=modname)
     elif removal_idxs or exact_moves or module_moves:
-        func = functools.partial(
+        return functools.partial(
             _replace_from_mixed,
             removal_idxs=removal_idxs,
             exact_moves=exact_moves,
             module_moves=module_moves,
         )
-        yield ast_to_offset(node), func
     elif mod in mods:
-        func = functools.partial(_replace_from_modname, modname=mods[mod])
-        yield ast_to_offset(node), func
+        return functools.partial(_replace_from_modname, modname=mods[mod])
+    else:
+        return None
 
 
 def _replace_import(
@@ -588,12 +582,7 @@ def _replace_import(
                 del tokens[j:part_end + 1]
 
 
-@register(ast.Import)
-def visit_Import(
-        state: State,
-        node: ast.Import,
-        parent: ast.AST,
-) -> Iterable[tuple[Offset, TokenFunc]]:
+def _import_func(state: State, node: ast.Import) -> TokenFunc | None:
     _, _, mods = _for_version(
         state.settings.min_version,
         keep_mock=state.settings.keep_mock,
@@ -612,9 +601,132 @@ def visit_Import(
                 exact_moves.append((i, new_mod, alias))
 
     if to_from or exact_moves:
-        func = functools.partial(
+        return functools.partial(
             _replace_import,
             exact_moves=exact_moves,
             to_from=to_from,
         )
-        yield ast_to_offset(node), func
+    else:
+        return None
+
+
+_RUNS_ATTR = '_pyupgrade_import_runs'
+
+
+def _import_run(
+        node: ast.Import | ast.ImportFrom,
+        parent: ast.AST,
+) -> tuple[ast.stmt, ...]:
+    """the contiguous import statements in `parent`'s body containing `node`"""
+    runs: dict[ast.AST, tuple[ast.stmt, ...]] | None
+    runs = getattr(parent, _RUNS_ATTR, None)
+    if runs is None:
+        runs = {}
+        for _, value in ast.iter_fields(parent):
+            if not isinstance(value, list):
+                continue
+            run: list[ast.stmt] = []
+            for stmt in (*value, None):
+                if (
+                        isinstance(stmt, (ast.Import, ast.ImportFrom)) and
+                        # `;`-separated statements share a line
+                        (not run or run[-1].end_lineno != stmt.lineno)
+                ):
+                    run.append(stmt)
+                else:
+                    runs.update(dict.fromkeys(run, tuple(run)))
+                    if isinstance(stmt, (ast.Import, ast.ImportFrom)):
+                        run = [stmt]
+                    else:
+                        run = []
+        setattr(parent, _RUNS_ATTR, runs)
+    return runs[node]
+
+
+def _fixed_by_block(i: int, tokens: list[Token]) -> None:
+    """rewritten by `_fix_import_block` at the start of the block"""
+
+
+def _fix_import_block(
+        i: int,
+        tokens: list[Token],
+        *,
+        funcs: list[tuple[Offset, TokenFunc]],
+) -> None:
+    # rewriting each statement in place would splice the whole token list
+    # once per statement.  instead rewrite a copy of each statement (with
+    # enough leading context to find its indentation), build the new block
+    # front to back and splice it in once.
+    block_start = pos = max(i - 2, 0)
+    new_tokens: list[Token] = []
+    j = i
+    for offset, func in funcs:
+        while (
+                tokens[j].line != offset.line or
+                tokens[j].utf8_byte_offset != offset.utf8_byte_offset or
+                not tokens[j].src
+        ):
+            j += 1
+        start = max(j - 2, 0)
+        end = find_end(tokens, j)
+
+        stmt_tokens = tokens[start:end]
+        func(j - start, stmt_tokens)
+
+        # the leading context is never modified, it may already have been
+        # emitted as the end of the previous statement
+        if start < pos:
+            del stmt_tokens[:pos - start]
+        else:
+            new_tokens.extend(tokens[pos:start])
+        new_tokens.extend(stmt_tokens)
+        pos = j = end
+
+    tokens[block_start:pos] = new_tokens
+
+
+def _visit_import(
+        state: State,
+        node: ast.Import | ast.ImportFrom,
+        parent: ast.AST,
+) -> Iterable[tuple[Offset, TokenFunc]]:
+    run = _import_run(node, parent)
+    # the whole run is handled when its first statement is visited
+    if run[0] is not node:
+        return
+
+    funcs = []
+    for stmt in run:
+        if isinstance(stmt, ast.ImportFrom):
+            func = _import_from_func(state, stmt)
+        else:
+            assert isinstance(stmt, ast.Import), stmt
+            func = _import_func(state, stmt)
+        if func is not None:
+            funcs.append((ast_to_offset(stmt), func))
+
+    if len(funcs) == 1:
+        yield funcs[0]
+    elif funcs:
+        first, _ = funcs[0]
+        yield first, functools.partial(_fix_import_block, funcs=funcs)
+        for offset, _ in funcs[1:]:
+            yield offset, _fixed_by_block
+
+
+@register(ast.ImportFrom)
+def visit_ImportFrom(
+        state: State,
+        node: ast.ImportFrom,
+        parent: ast.AST,
+) -> Iterable[tuple[Offset, TokenFunc]]:
+    return _visit_import(state, node, parent)
+
+
+@register(ast.Import)
+def visit_Import(
+        state: State,
+        node: ast.Import,
+        parent: ast.AST,
+) -> Iterable[tuple[Offset, TokenFunc]]:
+    return _visit_import(state, node, parent)
@@ -1,10 +1,7 @@
 from __future__ import annotations
 
 import ast
-import collections
-import contextlib
 import functools
-from collections.abc import Generator
 from collections.abc import Iterable
 
 from tokenize_rt import Offset
@@ -32,147 +29,92 @@ def _fix_yield(i: int, tokens: list[Token]) -> None:
     tokens[i:block.end] = [Token('CODE', f'yield from {container}\n')]
 
 
-class Scope:
-    def __init__(self, node: ast.AST) -> None:
-        self.node = node
-
-        self.reads: set[str] = set()
-        self.writes: set[str] = set()
+@register(ast.Call)
+def visit_Call(
+        state: State,
+        node: ast.Call,
+        parent: ast.AST,
+) -> Iterable[tuple[Offset, TokenFunc]]:
+    scopes = state.scopes
+    if (
+            isinstance(node.func, ast.Name) and
+            node.func.id == 'super' and
+            len(node.args) == 2 and
+            isinstance(node.args[1], ast.Name) and
+            # there are at least two scopes
+            len(scopes) >= 2 and
+            # the last scope is a function where the first arg is arg2
+            isinstance(scopes[-1].node, FUNC_TYPES) and
+            scopes[-1].node.args.args and
+            node.args[1].id == scopes[-1].node.args.args[0].arg
+    ):
+        args = node.args[0]
+        scope = len(scopes) - 2
+        current_scope = scopes[scope]
+        # if in nested classes, all names in arg1 must match the scopes
+        while (
+                isinstance(args, ast.Attribute) and
+                scope > 0 and
+                isinstance(current_scope.node, ast.ClassDef) and
+                args.attr == current_scope.node.name
+        ):
+            args = args.value
+            scope -= 1
+            current_scope = scopes[scope]
+        # now check if it is outer most class and its name match
+        if (
+                isinstance(args, ast.Name) and
+                isinstance(current_scope.node, ast.ClassDef) and
+                args.id == current_scope.node.name and
+                # an enclosing scope cannot be a class
+                (
+                    scope == 0 or
+                    not isinstance(scopes[scope - 1].node, ast.ClassDef)
+                )
+        ):
+            func = functools.partial(find_and_replace_call, template='super()')
+            yield ast_to_offset(node), func
 
-        self.yield_from_fors: set[Offset] = set()
-        self.yield_from_names: dict[str, set[Offset]]
-        self.yield_from_names = collections.defaultdict(set)
 
+def _names(node: ast.AST, ctx: type[ast.expr_context]) -> list[str]:
+    return [
+        node_.id
+        for node_ in ast.walk(node)
+        if isinstance(node_, ast.Name) and isinstance(node_.ctx, ctx)
+    ]
 
-class Visitor(ast.NodeVisitor):
-    def __init__(self) -> None:
-        self._scopes: list[Scope] = []
-        self.super_offsets: set[Offset] = set()
-        self.yield_offsets: set[Offset] = set()
 
-    @contextlib.contextmanager
-    def _scope(self, node: ast.AST) -> Generator[None]:
-        self._scopes.append(Scope(node))
-        try:
-            yield
-        finally:
-            info = self._scopes.pop()
-            # discard any that were referenced outside of the loop
-            for name in info.reads:
-                offsets = info.yield_from_names[name]
-                info.yield_from_fors.difference_update(offsets)
-            self.yield_offsets.update(info.yield_from_fors)
-            if self._scopes:
-                cell_reads = info.reads - info.writes
-                self._scopes[-1].reads.update(cell_reads)
-
-    def _visit_scope(self, node: ast.AST) -> None:
-        with self._scope(node):
-            self.generic_visit(node)
-
-    visit_ClassDef = _visit_scope
-    visit_Lambda = visit_FunctionDef = visit_AsyncFunctionDef = _visit_scope
-    visit_ListComp = visit_SetComp = _visit_scope
-    visit_DictComp = visit_GeneratorExp = _visit_scope
-
-    def visit_Name(self, node: ast.Name) -> None:
-        if self._scopes:
-            if isinstance(node.ctx, ast.Load):
-                self._scopes[-1].reads.add(node.id)
-            elif isinstance(node.ctx, (ast.Store, ast.Del)):
-                self._scopes[-1].writes.add(node.id)
-            else:
-                raise AssertionError(node)
-
-        self.generic_visit(node)
-
-    def visit_Call(self, node: ast.Call) -> None:
-        if (
-                isinstance(node.func, ast.Name) and
-                node.func.id == 'super' and
-                len(node.args) == 2 and
-                isinstance(node.args[1], ast.Name) and
-                # there are at least two scopes
-                len(self._scopes) >= 2 and
-                # the last scope is a function where the first arg is arg2
-                isinstance(self._scopes[-1].node, FUNC_TYPES) and
-                self._scopes[-1].node.args.args and
-                node.args[1].id == self._scopes[-1].node.args.args[0].arg
-        ):
-            args = node.args[0]
-            scope = len(self._scopes) - 2
-            current_scope = self._scopes[scope]
-            # if in nested classes, all names in arg1 must match the scopes
-            while (
-                    isinstance(args, ast.Attribute) and
-                    scope > 0 and
-                    isinstance(current_scope.node, ast.ClassDef) and
-                    args.attr == current_scope.node.name
-            ):
-                args = args.value
-                scope -= 1
-                current_scope = self._scopes[scope]
-            # now check if it is outer most class and its name match
-            if (
-                    isinstance(args, ast.Name) and
-                    isinstance(current_scope.node, ast.ClassDef) and
-                    args.id == current_scope.node.name and
-                    # an enclosing scope cannot be a class
-                    (
-                        scope == 0 or
-                        not isinstance(
-                            self._scopes[scope - 1].node,
-                            ast.ClassDef,
-                        )
-                    )
-            ):
-                self.super_offsets.add(ast_to_offset(node))
-
-        self.generic_visit(node)
-
-    def visit_For(self, node: ast.For) -> None:
-        if (
-            len(self._scopes) >= 1 and
-            not isinstance(self._scopes[-1].node, ast.AsyncFunctionDef) and
-            len(node.body) == 1 and
-            isinstance(node.body[0], ast.Expr) and
-            isinstance(node.body[0].value, ast.Yield) and
-            node.body[0].value.value is not None and
-            ast_eq(node.target, node.body[0].value.value) and
-            not node.orelse
-        ):
-            offset = ast_to_offset(node)
-            func_info = self._scopes[-1]
-            func_info.yield_from_fors.add(offset)
-            for target_node in ast.walk(node.target):
-                if (
-                        isinstance(target_node, ast.Name) and
-                        isinstance(target_node.ctx, ast.Store)
-                ):
-                    func_info.yield_from_names[target_node.id].add(offset)
-            # manually visit, but with target+body as a separate scope
-            self.visit(node.iter)
-            with self._scope(node):
-                self.visit(node.target)
-                for stmt in node.body:
-                    self.visit(stmt)
-                assert not node.orelse
-        else:
-            self.generic_visit(node)
-
-
-@register(ast.Module)
-def visit_Module(
+@register(ast.For)
+def visit_For(
         state: State,
-        node: ast.Module,
+        node: ast.For,
         parent: ast.AST,
 ) -> Iterable[tuple[Offset, TokenFunc]]:
-    visitor = Visitor()
-    visitor.visit(node)
+    if (
+        state.scopes and
+        not isinstance(state.scopes[-1].node, ast.AsyncFunctionDef) and
+        len(node.body) == 1 and
+        isinstance(node.body[0], ast.Expr) and
+        isinstance(node.body[0].value, ast.Yield) and
+        node.body[0].value.value is not None and
+        ast_eq(node.target, node.body[0].value.value) and
+        not node.orelse
+    ):
+        offset = ast_to_offset(node)
+        scope = state.scopes[-1]
+        targets = set(_names(node.target, ast.Store))
+
+        # the loop's own reads of its targets do not count, the reads from
+        # visiting the target and body later will cancel these out
+        loop_reads = _names(node.target, ast.Load)
+        loop_reads.extend(_names(node.body[0], ast.Load))
+        scope.reads.subtract(name for name in loop_reads if name in targets)
+
+        def _fix_if_not_read() -> Iterable[tuple[Offset, TokenFunc]]:
+            # discard any that were referenced outside of the loop
+            if not any(scope.reads[name] > 0 for name in targets):
+                yield offset, _fix_yield
 
-    super_func = functools.partial(find_and_replace_call, template='super()')
-    for offset in visitor.super_offsets:
-        yield offset, super_func
+        scope.exit_funcs.append(_fix_if_not_read)
 
-    for offset in visitor.yield_offsets:
-        yield offset, _fix_yield
+    return ()
@@ -3,10 +3,7 @@ from __future__ import annotations
 import ast
 import functools
 import re
-from collections.abc import Generator
 from collections.abc import Iterable
-from re import Match
-from re import Pattern
 from typing import Optional
 
 from tokenize_rt import Offset
@@ -31,76 +28,40 @@ PercentFormatPart = tuple[
 ]
 PercentFormat = tuple[str, Optional[PercentFormatPart]]
 
-MAPPING_KEY_RE = re.compile(r'\(([^()]*)\)')
-CONVERSION_FLAG_RE = re.compile('[#0+ -]*')
-WIDTH_RE = re.compile(r'(?:\*|\d*)')
-PRECISION_RE = re.compile(r'(?:\.(?:\*|\d*))?')
-LENGTH_RE = re.compile('[hlL]?')
-
-
-def _must_match(regex: Pattern[str], string: str, pos: int) -> Match[str]:
-    match = regex.match(string, pos)
-    assert match is not None
-    return match
-
-
+PERCENT_RE = re.compile(
+    r'%'
+    r'(?:\(([^()]*)\))?'  # mapping key
+    r'([#0+ -]*)'  # conversion flag
+    r'(\*|\d*)'  # width
+    r'(\.(?:\*|\d*))?'  # precision
+    r'[hlL]?'  # length modifier is ignored
+    r'(.)?',  # conversion
+    re.DOTALL,
+)
+# format strings repeat a lot (logging!) so parses / rewrites are memoized
+_CACHE_SIZE = 4096
+
+
+@functools.lru_cache(maxsize=_CACHE_SIZE)
 def _parse_percent_format(s: str) -> tuple[PercentFormat, ...]:
-    def _parse_inner() -> Generator[PercentFormat]:
-        string_start = 0
-        string_end = 0
-        in_fmt = False
-
-        i = 0
-        while i < len(s):
-            if not in_fmt:
-                try:
-                    i = s.index('%', i)
-                except ValueError:  # no more % fields!
-                    yield s[string_start:], None
-                    return
-                else:
-                    string_end = i
-                    i += 1
-                    in_fmt = True
-            else:
-                key_match = MAPPING_KEY_RE.match(s, i)
-                if key_match:
-                    key: str | None = key_match.group(1)
-                    i = key_match.end()
-                else:
-                    key = None
-
-                conversion_flag_match = _must_match(CONVERSION_FLAG_RE, s, i)
-                conversion_flag = conversion_flag_match.group() or None
-                i = conversion_flag_match.end()
-
-                width_match = _must_match(WIDTH_RE, s, i)
-                width = width_match.group() or None
-                i = width_match.end()
-
-                precision_match = _must_match(PRECISION_RE, s, i)
-                precision = precision_match.group() or None
-                i = precision_match.end()
-
-                # length modifier is ignored
-                i = _must_match(LENGTH_RE, s, i).end()
-
-                try:
-                    conversion = s[i]
-                except IndexError:
-                    raise ValueError('end-of-string while parsing format')
-                i += 1
-
-                fmt = (key, conversion_flag, width, precision, conversion)
-                yield s[string_start:string_end], fmt
-
-                in_fmt = False
-                string_start = i
-
-        if in_fmt:
+    ret: list[PercentFormat] = []
+    string_start = 0
+    for match in PERCENT_RE.finditer(s):
+        key, conversion_flag, width, precision, conversion = match.groups()
+        if conversion is None:
             raise ValueError('end-of-string while parsing format')
-
-    return tuple(_parse_inner())
+        fmt = (
+            key,
+            conversion_flag or None,
+            width or None,
+            precision or None,
+            conversion,
+        )
+        ret.append((s[string_start:match.start()], fmt))
+        string_start = match.end()
+    if string_start < len(s):
+        ret.append((s[string_start:], None))
+    return tuple(ret)
 
 
 def _simplify_conversion_flag(flag: str) -> str:
@@ -117,6 +78,7 @@ def _simplify_conversion_flag(flag: str) -> str:
     return ''.join(parts)
 
 
+@functools.lru_cache(maxsize=_CACHE_SIZE)
 def _percent_to_format(s: str) -> str:
     def _handle_part(part: PercentFormat) -> str:
         s, fmt = part
@@ -228,6 +190,46 @@ def _fix_percent_format_dict(
     tokens[i + 1:brace + 1] = [Token('CODE', '.format'), Token('OP', '(')]
 
 
+@functools.lru_cache(maxsize=_CACHE_SIZE)
+def _convertible(s: str, *, named: bool) -> bool:
+    try:
+        parsed = _parse_percent_format(s)
+    except ValueError:
+        return False
+
+    for _, fmt in parsed:
+        if not fmt:
+            continue
+        key, conversion_flag, width, precision, conversion = fmt
+        # timid: these require out-of-order parameter consumption
+        if width == '*' or precision == '.*':
+            return False
+        # these conversions require modification of parameters
+        if conversion in {'d', 'i', 'u', 'c'}:
+            return False
+        # timid: py2: %#o formats different from {:#o} (--py3?)
+        if '#' in (conversion_flag or '') and conversion == 'o':
+            return False
+        # no equivalent in format
+        if key == '':
+            return False
+        # timid: py2: conversion is subject to modifiers (--py3?)
+        nontrivial_fmt = any((conversion_flag, width, precision))
+        if conversion == '%' and nontrivial_fmt:
+            return False
+        # no equivalent in format
+        if conversion in {'a', 'r'} and nontrivial_fmt:
+            return False
+        # %s with None and width is not supported
+        if width and conversion == 's':
+            return False
+        # all dict substitutions must be named
+        if named and not key:
+            return False
+
+    return True
+
+
 @register(ast.BinOp)
 def visit_BinOp(
         state: State,
@@ -240,50 +242,17 @@ def visit_BinOp(
             isinstance(node.left, ast.Constant) and
             isinstance(node.left.value, str)
     ):
-        try:
-            parsed = _parse_percent_format(node.left.value)
-        except ValueError:
-            pass
-        else:
-            for _, fmt in parsed:
-                if not fmt:
-                    continue
-                key, conversion_flag, width, precision, conversion = fmt
-                # timid: these require out-of-order parameter consumption
-                if width == '*' or precision == '.*':
-                    break
-                # these conversions require modification of parameters
-                if conversion in {'d', 'i', 'u', 'c'}:
-                    break
-                # timid: py2: %#o formats different from {:#o} (--py3?)
-                if '#' in (conversion_flag or '') and conversion == 'o':
-                    break
-                # no equivalent in format
-                if key == '':
-                    break
-                # timid: py2: conversion is subject to modifiers (--py3?)
-                nontrivial_fmt = any((conversion_flag, width, precision))
-                if conversion == '%' and nontrivial_fmt:
-                    break
-                # no equivalent in format
-                if conversion in {'a', 'r'} and nontrivial_fmt:
-                    break
-                # %s with None and width is not supported
-                if width and conversion == 's':
-                    break
-                # all dict substitutions must be named
-                if isinstance(node.right, ast.Dict) and not key:
-                    break
-            else:
-                if isinstance(node.right, ast.Tuple):
-                    func = functools.partial(
-                        _fix_percent_format_tuple,
-                        node_right=node.right,
-                    )
-                    yield ast_to_offset(node), func
-                elif isinstance(node.right, ast.Dict):
-                    func = functools.partial(
-                        _fix_percent_format_dict,
-                        node_right=node.right,
-                    )
-                    yield ast_to_offset(node), func
+        if isinstance(node.right, ast.Tuple):
+            if _convertible(node.left.value, named=False):
+                func = functools.partial(
+                    _fix_percent_format_tuple,
+                    node_right=node.right,
+                )
+                yield ast_to_offset(node), func
+        elif isinstance(node.right, ast.Dict):
+            if _convertible(node.left.value, named=True):
+                func = functools.partial(
+                    _fix_percent_format_dict,
+                    node_right=node.right,
+                )
+                yield ast_to_offset(node), func
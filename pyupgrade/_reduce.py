@@ -0,0 +1,253 @@
+from __future__ import annotations
+
+import argparse
+import ast
+import time
+from collections.abc import Callable
+from collections.abc import Iterable
+
+from pyupgrade._ast_helpers import ast_parse
+from pyupgrade._deadline import deadline
+from pyupgrade._deadline import DeadlineExceeded
+
+Span = tuple[int, int]
+_Node = ast.expr | ast.keyword
+
+# `ms` before `s` as it has the same ending
+_UNITS = (('ms', .001), ('s', 1.), ('m', 60.))
+
+
+def parse_duration(s: str) -> float:
+    """`2s` / `500ms` / `1.5` (seconds)"""
+    for suffix, scale in _UNITS:
+        if s.endswith(suffix):
+            number = s[:-len(suffix)]
+            break
+    else:
+        number, scale = s, 1.
+    try:
+        seconds = float(number) * scale
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected a duration, got {s!r}')
+    if seconds <= 0:
+        raise argparse.ArgumentTypeError(f'expected a duration, got {s!r}')
+    return seconds
+
+
+def slower_than(
+        fix: Callable[[str], object],
+        seconds: float,
+) -> Callable[[bytes], bool]:
+    """whether `contents` parses and `fix` takes longer than `seconds`"""
+    def is_slow(contents: bytes) -> bool:
+        try:
+            ast_parse(contents)
+            contents_text = contents.decode()
+        except (SyntaxError, ValueError):
+            return False
+
+        t0 = time.monotonic()
+        try:
+            # stop as soon as the candidate is known to be slow enough
+            with deadline(seconds):
+                fix(contents_text)
+        except DeadlineExceeded:
+            return True
+        return time.monotonic() - t0 > seconds
+
+    return is_slow
+
+
+def _line_starts(contents: bytes) -> list[int]:
+    starts = [0]
+    for line in contents.splitlines(True):
+        starts.append(starts[-1] + len(line))
+    return starts
+
+
+def _blank_lines(contents: bytes, starts: list[int]) -> list[Span]:
+    """lines which are empty or only a comment"""
+    ret = []
+    for start, end in zip(starts, starts[1:]):
+        line = contents[start:end].strip()
+        if not line or line.startswith(b'#'):
+            ret.append((start, end))
+    return ret
+
+
+def _statement_levels(tree: ast.Module, starts: list[int]) -> list[list[Span]]:
+    """whole lines of statements, grouped by nesting depth"""
+    levels: list[list[Span]] = []
+
+    def _visit(body: list[ast.stmt], depth: int) -> None:
+        if len(levels) <= depth:
+            levels.append([])
+        prev_end = 0
+        for stmt in body:
+            decorators = getattr(stmt, 'decorator_list', [])
+            first = min([stmt.lineno, *(d.lineno for d in decorators)])
+            end = stmt.end_lineno
+            assert end is not None
+            if first <= prev_end:  # `a; b` share their lines
+                start, _ = levels[depth].pop()
+            else:
+                start = starts[first - 1]
+            levels[depth].append((start, starts[end]))
+            prev_end = end
+
+            for name in ('body', 'orelse', 'finalbody'):
+                child = getattr(stmt, name, None)
+                if child and isinstance(child[0], ast.stmt):
+                    _visit(child, depth + 1)
+            for parent in (
+                    *getattr(stmt, 'handlers', ()),
+                    *getattr(stmt, 'cases', ()),
+            ):
+                _visit(parent.body, depth + 1)
+
+    _visit(tree.body, 0)
+    return levels
+
+
+def _elements(node: ast.AST) -> list[tuple[_Node, _Node]]:
+    """(first, last) nodes of the comma separated parts of a display / call"""
+    if isinstance(node, (ast.List, ast.Tuple, ast.Set)):
+        return [(elt, elt) for elt in node.elts]
+    elif isinstance(node, ast.Call):
+        args: list[_Node] = [*node.args, *node.keywords]
+        args.sort(key=lambda arg: (arg.lineno, arg.col_offset))
+        return [(arg, arg) for arg in args]
+    elif isinstance(node, ast.Dict) and None not in node.keys:
+        return [
+            (k, v) for k, v in zip(node.keys, node.values) if k is not None
+        ]
+    else:
+        return []
+
+
+def _expression_levels(
+        tree: ast.Module,
+        starts: list[int],
+) -> list[list[Span]]:
+    """parts of displays and calls (with their commas), grouped by depth"""
+    levels: list[list[Span]] = []
+
+    def _offset(line: int | None, col: int | None) -> int:
+        assert line is not None and col is not None
+        return starts[line - 1] + col
+
+    def _visit(node: ast.AST, depth: int) -> None:
+        if isinstance(node, ast.JoinedStr):
+            return  # positions inside f-strings vary between versions
+
+        elements = _elements(node)
+        if elements:
+            if len(levels) <= depth:
+                levels.append([])
+            bounds = [
+                (
+                    _offset(first.lineno, first.col_offset),
+                    _offset(last.end_lineno, last.end_col_offset),
+                )
+                for first, last in elements
+            ]
+            # remove a part with the comma after it (or before it for the
+            # last one) so the rest stays valid
+            for i, (start, end) in enumerate(bounds):
+                if i + 1 < len(bounds):
+                    levels[depth].append((start, bounds[i + 1][0]))
+                elif i > 0:
+                    levels[depth].append((bounds[i - 1][1], end))
+                else:
+                    levels[depth].append((start, end))
+            depth += 1
+
+        for child in ast.iter_child_nodes(node):
+            _visit(child, depth)
+
+    _visit(tree, 0)
+    return levels
+
+
+def _levels(contents: bytes) -> list[list[Span]]:
+    tree = ast_parse(contents)
+    starts = _line_starts(contents)
+    return [
+        _blank_lines(contents, starts),
+        *_statement_levels(tree, starts),
+        *_expression_levels(tree, starts),
+    ]
+
+
+def _delete(contents: bytes, spans: Iterable[Span]) -> bytes:
+    parts = []
+    pos = 0
+    for start, end in sorted(spans):
+        if start > pos:
+            parts.append(contents[pos:start])
+        pos = max(pos, end)
+    parts.append(contents[pos:])
+    return b''.join(parts)
+
+
+def _ddmin(n: int, test: Callable[[list[int]], bool]) -> list[int]:
+    """a 1-minimal subset of `range(n)` for which `test` holds (zeller's)"""
+    items = list(range(n))
+    if test([]):
+        return []
+
+    granularity = 2
+    while len(items) >= 2:
+        size = -(-len(items) // granularity)
+        subsets = [items[i:i + size] for i in range(0, len(items), size)]
+        for subset in subsets:
+            if test(subset):
+                items, granularity = subset, 2
+                break
+        else:
+            for subset in subsets:
+                complement = [i for i in items if i not in subset]
+                if test(complement):
+                    items = complement
+                    granularity = max(granularity - 1, 2)
+                    break
+            else:
+                if granularity >= len(items):
+                    break
+                granularity = min(granularity * 2, len(items))
+    return items
+
+
+def reduce(contents: bytes, is_slow: Callable[[bytes], bool]) -> bytes:
+    """delta debug `contents` to a smaller source for which `is_slow` holds
+
+    blank and comment lines are removed first, then statements (outermost
+    first), then parts of displays and calls, repeating until nothing more
+    can be removed
+    """
+    tested: dict[bytes, bool] = {}
+
+    def _test(candidate: bytes) -> bool:
+        if candidate not in tested:
+            tested[candidate] = is_slow(candidate)
+        return tested[candidate]
+
+    changed = True
+    while changed:
+        changed = False
+        i = 0
+        # the spans are recomputed after every change as the offsets move
+        while i < len(levels := _levels(contents)):
+            spans = levels[i]
+
+            def _keeping(kept: list[int]) -> bytes:
+                keep = set(kept)
+                removed = [s for j, s in enumerate(spans) if j not in keep]
+                return _delete(contents, removed)
+
+            kept = _ddmin(len(spans), lambda kept: _test(_keeping(kept)))
+            if len(kept) < len(spans):
+                contents = _keeping(kept)
+                changed = True
+            i += 1
+    return contents
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import json
+import os
+from collections.abc import Sequence
+
+from pyupgrade._git import normpath
+
+# seconds per byte when there is no history to calibrate against
+_DEFAULT_RATE = 1e-6
+
+
+def load_history(filename: str) -> dict[str, float]:
+    """per-file durations (in seconds) recorded by previous runs"""
+    try:
+        with open(filename, encoding='UTF-8') as f:
+            history = json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(history, dict):
+        return {}
+    return {
+        k: v for k, v in history.items()
+        if isinstance(k, str) and isinstance(v, (int, float))
+    }
+
+
+def save_history(
+        filename: str,
+        history: dict[str, float],
+        durations: dict[str, float],
+) -> None:
+    # forget files which no longer exist so the history stays small
+    history = {
+        k: v for k, v in {**history, **durations}.items()
+        if os.path.exists(k)
+    }
+    with open(f'{filename}.tmp', 'w', encoding='UTF-8') as f:
+        json.dump(history, f, indent=0, sort_keys=True)
+    os.replace(f'{filename}.tmp', filename)
+
+
+def _size(filename: str) -> int:
+    try:
+        return os.stat(filename).st_size
+    except OSError:
+        return 0
+
+
+def largest_first(
+        filenames: Sequence[str],
+        history: dict[str, float],
+) -> list[int]:
+    """indices of `filenames`, most expensive first
+
+    the cost is the duration recorded in `history` or otherwise the size,
+    converted to seconds at the rate seen for the files which have both
+    """
+    sizes = [_size(filename) for filename in filenames]
+    if not history:  # don't pay for normpath (a stat per path component)
+        return sorted(range(len(filenames)), key=lambda i: -sizes[i])
+    paths = [normpath(filename) for filename in filenames]
+
+    known_seconds = known_bytes = 0.
+    for path, size in zip(paths, sizes):
+        if path in history:
+            known_seconds += history[path]
+            known_bytes += size
+    rate = known_seconds / known_bytes if known_bytes else _DEFAULT_RATE
+
+    costs = [
+        history.get(path, size * rate) for path, size in zip(paths, sizes)
+    ]
+    return sorted(range(len(filenames)), key=lambda i: -costs[i])
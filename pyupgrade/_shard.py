@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+from collections.abc import Sequence
+from typing import NamedTuple
+
+
+class Shard(NamedTuple):
+    k: int  # 1-based
+    n: int
+
+    def __str__(self) -> str:
+        return f'{self.k}/{self.n}'
+
+
+def parse_shard(s: str) -> Shard:
+    index_s, _, count_s = s.partition('/')
+    try:
+        index, count = int(index_s), int(count_s)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'expected K/N, got {s!r}')
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f'expected 1 <= K <= N, got {s!r}')
+    return Shard(index, count)
+
+
+def _stable_hash(filename: str) -> int:
+    # the path as given (usually relative to the checkout) with `/`
+    # separators so every machine agrees
+    key = filename.replace(os.sep, '/').encode()
+    return int.from_bytes(hashlib.sha256(key).digest()[:8], 'big')
+
+
+def _size(filename: str) -> int:
+    try:
+        return os.stat(filename).st_size
+    except OSError:
+        return 0
+
+
+def select(
+        filenames: Sequence[str],
+        shard: Shard,
+        *,
+        by_size: bool,
+) -> list[str]:
+    """the files (in their original order) which belong to `shard`
+
+    every shard must be given the same list of files
+    """
+    if by_size:
+        # greedily give the biggest remaining file to the lightest shard,
+        # ties broken by path so the assignment is the same everywhere
+        loads = [0] * shard.n
+        mine = set()
+        ordered = sorted(set(filenames), key=lambda f: (-_size(f), f))
+        for filename in ordered:
+            i = min(range(shard.n), key=lambda i: loads[i])
+            loads[i] += _size(filename)
+            if i == shard.k - 1:
+                mine.add(filename)
+        return [filename for filename in filenames if filename in mine]
+    else:
+        return [
+            filename for filename in filenames
+            if _stable_hash(filename) % shard.n == shard.k - 1
+        ]
+
+
+def write_results(
+        filename: str,
+        *,
+        shard: Shard | None,
+        returncode: int,
+        files: Sequence[str],
+        failed: Sequence[str],
+) -> None:
+    results = {
+        'shard': None if shard is None else str(shard),
+        'returncode': returncode,
+        'files': len(files),
+        'failed': sorted(failed),
+    }
+    with open(filename, 'w', encoding='UTF-8') as f:
+        json.dump(results, f)
+        f.write('\n')
+
+
+def merge_reports(filenames: Sequence[str]) -> int:
+    """combine `--results-json` files of all shards into one status"""
+    returncode = 0
+    files = 0
+    failed: list[str] = []
+    seen: dict[str, str] = {}
+    counts = set()
+    for filename in filenames:
+        try:
+            with open(filename, encoding='UTF-8') as f:
+                results = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f'{filename}: cannot read results ({e})', file=sys.stderr)
+            return 1
+
+        shard = results['shard']
+        if shard is not None:
+            if shard in seen:
+                print(
+                    f'{filename}: shard {shard} already in {seen[shard]}',
+                    file=sys.stderr,
+                )
+                return 1
+            seen[shard] = filename
+            counts.add(parse_shard(shard).n)
+
+        returncode |= results['returncode']
+        files += results['files']
+        failed.extend(results['failed'])
+
+    if len(counts) > 1:
+        print('results are from different numbers of shards', file=sys.stderr)
+        return 1
+    elif counts:
+        count, = counts
+        missing = [
+            str(Shard(i, count)) for i in range(1, count + 1)
+            if str(Shard(i, count)) not in seen
+        ]
+        if missing:
+            print(f'missing shards: {", ".join(missing)}', file=sys.stderr)
+            return 1
+
+    print(json.dumps({
+        'returncode': returncode,
+        'files': files,
+        'failed': sorted(failed),
+    }))
+    return returncode
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import ast
+import contextlib
+import contextvars
 import keyword
+from collections.abc import Generator
 from collections.abc import Sequence
 from typing import NamedTuple
 
@@ -166,6 +169,95 @@ def find_block_start(tokens: list[Token], i: int) -> int:
     return i
 
 
+_LEVEL_CHANGE = {'INDENT': 1, 'DEDENT': -1}
+
+
+class BlockTree:
+    """the INDENT / DEDENT structure of a token list, computed once
+
+    callbacks rewrite the tokens from the end of the file backwards so
+    indices shift.  blocks are therefore keyed by the position of their
+    INDENT token in the original source (which is preserved when dedenting
+    replaces it) and remember the identity of their matching DEDENT token.
+    """
+
+    def __init__(self, tokens: list[Token]) -> None:
+        self.tokens = tokens
+        self._blocks: dict[tuple[int, int], tuple[Token, int]] | None = None
+
+    def _build(self) -> dict[tuple[int, int], tuple[Token, int]]:
+        blocks = {}
+        stack = []
+        for i, token in enumerate(self.tokens):
+            if token.name == 'INDENT':
+                stack.append(i)
+            elif token.name == 'DEDENT':
+                start = stack.pop()
+                indent = self.tokens[start]
+                key = (indent.line, indent.utf8_byte_offset)
+                blocks[key] = (token, i - start)
+        return blocks
+
+    def end(self, i: int) -> int | None:
+        """index after the DEDENT matching the INDENT at `i`"""
+        if self._blocks is None:
+            self._blocks = self._build()
+
+        tokens = self.tokens
+        key = (tokens[i].line, tokens[i].utf8_byte_offset)
+        try:
+            dedent, length = self._blocks[key]
+        except KeyError:
+            return None
+
+        # the block has not been rewritten
+        j = i + length
+        if j < len(tokens) and tokens[j] is dedent:
+            return j + 1
+
+        # otherwise search for it (the DEDENTs closing several blocks at
+        # once compare equal so step to the identical one)
+        try:
+            j = tokens.index(dedent, i)
+        except ValueError:
+            return None
+        while j < len(tokens) and tokens[j] == dedent:
+            if tokens[j] is dedent:
+                return j + 1
+            j += 1
+        else:
+            return None
+
+
+_BLOCK_TREE: contextvars.ContextVar[BlockTree | None]
+_BLOCK_TREE = contextvars.ContextVar('_BLOCK_TREE', default=None)
+
+
+@contextlib.contextmanager
+def block_tree(tokens: list[Token]) -> Generator[None]:
+    """use a (lazily built) `BlockTree` for `Block.find` on `tokens`"""
+    token = _BLOCK_TREE.set(BlockTree(tokens))
+    try:
+        yield
+    finally:
+        _BLOCK_TREE.reset(token)
+
+
+def _block_end(tokens: list[Token], i: int) -> int:
+    tree = _BLOCK_TREE.get()
+    if tree is not None and tree.tokens is tokens:
+        end = tree.end(i)
+        if end is not None:
+            return end
+
+    level = 1
+    i += 1
+    while level:
+        level += _LEVEL_CHANGE.get(tokens[i].name, 0)
+        i += 1
+    return i
+
+
 class Block(NamedTuple):
     start: int
     colon: int
@@ -179,38 +271,39 @@ class Block(NamedTuple):
         else:
             return 0
 
-    def _minimum_indent(self, tokens: list[Token]) -> int:
-        block_indent = None
-        for i in range(self.block, self.end):
+    def _indents(self, tokens: list[Token]) -> list[int]:
+        """indices of the indentation tokens at the start of lines"""
+        return [
+            i
+            for i in range(self.block, self.end)
             if (
-                    tokens[i - 1].name in ('NL', 'NEWLINE') and
-                    tokens[i].name in ('INDENT', UNIMPORTANT_WS) and
-                    # comments can have arbitrary indentation so ignore them
-                    tokens[i + 1].name != 'COMMENT'
-            ):
-                token_indent = len(tokens[i].src)
-                if block_indent is None:
-                    block_indent = token_indent
-                else:
-                    block_indent = min(block_indent, token_indent)
-
-        assert block_indent is not None
-        return block_indent
+                tokens[i].name in ('INDENT', UNIMPORTANT_WS) and
+                tokens[i - 1].name in ('DEDENT', 'NL', 'NEWLINE')
+            )
+        ]
+
+    def _minimum_indent(self, tokens: list[Token], indents: list[int]) -> int:
+        return min(
+            len(tokens[i].src)
+            for i in indents
+            if (
+                tokens[i - 1].name != 'DEDENT' and
+                # comments can have arbitrary indentation so ignore them
+                tokens[i + 1].name != 'COMMENT'
+            )
+        )
 
     def dedent(self, tokens: list[Token]) -> None:
         if self.line:
             return
         initial_indent = self._initial_indent(tokens)
-        diff = self._minimum_indent(tokens) - initial_indent
-        for i in range(self.block, self.end):
-            if (
-                    tokens[i - 1].name in ('DEDENT', 'NL', 'NEWLINE') and
-                    tokens[i].name in ('INDENT', UNIMPORTANT_WS)
-            ):
-                # make sure we preserve *at least* the initial indent
-                s = tokens[i].src
-                s = s[:initial_indent] + s[initial_indent + diff:]
-                tokens[i] = tokens[i]._replace(src=s)
+        indents = self._indents(tokens)
+        diff = self._minimum_indent(tokens, indents) - initial_indent
+        for i in indents:
+            # make sure we preserve *at least* the initial indent
+            s = tokens[i].src
+            s = s[:initial_indent] + s[initial_indent + diff:]
+            tokens[i] = tokens[i]._replace(src=s)
 
     def replace_condition(self, tokens: list[Token], new: list[Token]) -> None:
         start = self.start
@@ -260,11 +353,7 @@ class Block(NamedTuple):
             block = j + 1
             while tokens[j].name != 'INDENT':
                 j += 1
-            level = 1
-            j += 1
-            while level:
-                level += {'INDENT': 1, 'DEDENT': -1}.get(tokens[j].name, 0)
-                j += 1
+            j = _block_end(tokens, j)
             ret = cls(start, colon, block, j, line=False)
             if trim_end:
                 return ret._trim_end(tokens)
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import os
+import time
+from collections.abc import Callable
+
+Stat = tuple[int, int]
+
+
+def scan(root: str) -> dict[str, Stat]:
+    """(mtime, size) of every python file under `root`, skipping dotdirs"""
+    ret = {}
+    todo = [root]
+    while todo:
+        # files and directories may disappear while we look at them (eg on
+        # a branch switch or an editor's save-by-rename)
+        try:
+            it = os.scandir(todo.pop())
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                if entry.name.startswith('.'):
+                    continue
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        todo.append(entry.path)
+                    elif entry.name.endswith('.py') and entry.is_file():
+                        st = entry.stat()
+                        ret[entry.path] = (st.st_mtime_ns, st.st_size)
+                except OSError:
+                    continue
+    return ret
+
+
+def _stat(filename: str) -> Stat | None:
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    else:
+        return (st.st_mtime_ns, st.st_size)
+
+
+def watch(
+        root: str,
+        func: Callable[[str], object],
+        *,
+        interval: float,
+        polls: int | None = None,
+) -> None:
+    """run `func` on every file under `root`, then again whenever it changes
+
+    polls forever unless `polls` is given
+    """
+    seen: dict[str, Stat] = {}
+    while True:
+        current = scan(root)
+        for filename, stat in sorted(current.items()):
+            if seen.get(filename) != stat:
+                try:
+                    func(filename)
+                except OSError:
+                    # removed since the scan, it is new if it comes back
+                    del current[filename]
+                    continue
+                # don't pick up our own rewrite as a change next time
+                current[filename] = _stat(filename) or stat
+        seen = current
+
+        if polls is not None:
+            polls -= 1
+            if polls <= 0:
+                return
+        time.sleep(interval)
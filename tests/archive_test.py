@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import io
+import tarfile
+import zipfile
+
+import pytest
+
+from pyupgrade._archive import ArchiveError
+from pyupgrade._archive import is_archive
+from pyupgrade._archive import process
+
+
+def _fix(name, contents):
+    if b'set((1,))' in contents:
+        return contents.replace(b'set((1,))', b'{1}')
+    else:
+        return None
+
+
+def _write_tar(filename, members):
+    with tarfile.open(filename, 'w:gz') as tf:
+        directory = tarfile.TarInfo('pkg')
+        directory.type = tarfile.DIRTYPE
+        tf.addfile(directory)
+        for name, contents in members.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(contents)
+            tf.addfile(info, io.BytesIO(contents))
+
+
+def _read_tar(filename):
+    ret = {}
+    with tarfile.open(filename) as tf:
+        for member in tf.getmembers():
+            if member.isfile():
+                src = tf.extractfile(member)
+                assert src is not None
+                ret[member.name] = src.read()
+    return ret
+
+
+@pytest.mark.parametrize(
+    ('filename', 'expected'),
+    (
+        ('pkg-1.0.tar.gz', True),
+        ('pkg-1.0.TGZ', True),
+        ('pkg-1.0-py3-none-any.whl', True),
+        ('src.zip', True),
+        ('t.py', False),
+        ('archive.gz', False),
+    ),
+)
+def test_is_archive(filename, expected):
+    assert is_archive(filename) is expected
+
+
+def test_process_tar_check(tmpdir):
+    filename = str(tmpdir.join('pkg.tar.gz'))
+    members = {'pkg/a.py': b'x = set((1,))\n', 'pkg/b.txt': b'set((1,))\n'}
+    _write_tar(filename, members)
+    seen = []
+
+    def fix(name, contents):
+        seen.append(name)
+        return _fix(name, contents)
+
+    assert process(filename, fix, write=False) is True
+    assert seen == ['pkg/a.py']
+    assert _read_tar(filename) == members
+    assert tmpdir.listdir() == [tmpdir.join('pkg.tar.gz')]
+
+
+def test_process_tar_write(tmpdir):
+    filename = str(tmpdir.join('pkg.tar.gz'))
+    _write_tar(filename, {
+        'pkg/a.py': b'x = set((1,))\n',
+        'pkg/b.py': b'x = 1\n',
+        'pkg/c.txt': b'set((1,))\n',
+    })
+    assert process(filename, _fix, write=True) is True
+    assert _read_tar(filename) == {
+        'pkg/a.py': b'x = {1}\n',
+        'pkg/b.py': b'x = 1\n',
+        'pkg/c.txt': b'set((1,))\n',
+    }
+    assert tmpdir.listdir() == [tmpdir.join('pkg.tar.gz')]
+
+
+def test_process_tar_write_links(tmpdir):
+    filename = str(tmpdir.join('pkg.tar.gz'))
+    with tarfile.open(filename, 'w:gz') as tf:
+        contents = b'x = set((1,))\n'
+        info = tarfile.TarInfo('pkg/a.py')
+        info.size = len(contents)
+        tf.addfile(info, io.BytesIO(contents))
+        for name, tp in (
+                ('pkg/sym.py', tarfile.SYMTYPE),
+                ('pkg/hard.py', tarfile.LNKTYPE),
+                ('pkg/sym.txt', tarfile.SYMTYPE),
+        ):
+            link = tarfile.TarInfo(name)
+            link.type = tp
+            link.linkname = 'a.py' if tp == tarfile.SYMTYPE else 'pkg/a.py'
+            tf.addfile(link)
+
+    assert process(filename, _fix, write=True) is True
+    assert _read_tar(filename) == {'pkg/a.py': b'x = {1}\n'}
+    with tarfile.open(filename) as tf:
+        links = {
+            member.name: (member.type, member.linkname)
+            for member in tf.getmembers()
+            if member.issym() or member.islnk()
+        }
+    assert links == {
+        'pkg/sym.py': (tarfile.SYMTYPE, 'a.py'),
+        'pkg/hard.py': (tarfile.LNKTYPE, 'pkg/a.py'),
+        'pkg/sym.txt': (tarfile.SYMTYPE, 'a.py'),
+    }
+
+
+def test_process_unchanged_keeps_archive(tmpdir):
+    filename = str(tmpdir.join('pkg.tar'))
+    _write_tar(filename, {'pkg/a.py': b'x = 1\n'})
+    mtime = tmpdir.join('pkg.tar').mtime()
+    assert process(filename, _fix, write=True) is False
+    assert tmpdir.join('pkg.tar').mtime() == mtime
+    assert tmpdir.listdir() == [tmpdir.join('pkg.tar')]
+
+
+def _record_line(name, contents):
+    digest = hashlib.sha256(contents).digest()
+    b64 = base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+    return f'{name},sha256={b64},{len(contents)}\n'
+
+
+def test_process_wheel_updates_record(tmpdir):
+    filename = str(tmpdir.join('pkg-1.0-py3-none-any.whl'))
+    a, b = b'x = set((1,))\n', b'x = 1\n'
+    record = (
+        _record_line('pkg/a.py', a) +
+        _record_line('pkg/b.py', b) +
+        'pkg-1.0.dist-info/RECORD,,\n'
+    )
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('pkg/a.py', a)
+        zf.writestr('pkg/b.py', b)
+        zf.writestr('pkg-1.0.dist-info/RECORD', record)
+
+    assert process(filename, _fix, write=True) is True
+    with zipfile.ZipFile(filename) as zf:
+        assert zf.namelist() == [
+            'pkg/a.py', 'pkg/b.py', 'pkg-1.0.dist-info/RECORD',
+        ]
+        assert zf.getinfo('pkg/a.py').compress_type == zipfile.ZIP_DEFLATED
+        assert zf.read('pkg/a.py') == b'x = {1}\n'
+        assert zf.read('pkg-1.0.dist-info/RECORD').decode() == (
+            _record_line('pkg/a.py', b'x = {1}\n') +
+            _record_line('pkg/b.py', b) +
+            'pkg-1.0.dist-info/RECORD,,\n'
+        )
+
+
+def test_process_invalid(tmpdir):
+    f = tmpdir.join('bad.zip')
+    f.write('not a zip')
+    with pytest.raises(ArchiveError):
+        process(str(f), _fix, write=True)
+    assert tmpdir.listdir() == [f]
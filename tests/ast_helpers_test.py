@@ -1,9 +1,20 @@
 from __future__ import annotations
 
 import ast
+import time
+import warnings
+from unittest import mock
 
+import pytest
+
+from pyupgrade import _ast_helpers
 from pyupgrade._ast_helpers import _fields_same
 from pyupgrade._ast_helpers import ast_eq
+from pyupgrade._ast_helpers import ast_parse
+from pyupgrade._ast_helpers import contains_await
+from pyupgrade._ast_helpers import node_summary
+from pyupgrade._ast_helpers import structural_hash
+from pyupgrade._ast_helpers import Summary
 
 
 def test_ast_eq():
@@ -19,3 +30,84 @@ def _get_body(expr):
 
 def test_fields_same():
     assert not _fields_same(_get_body('x'), _get_body('1'))
+
+
+def test_node_summary():
+    summary = node_summary(_get_body('f(*a, (yield b), [c async for c in d])'))
+    assert summary == Summary(
+        contains_await=False,
+        contains_yield=True,
+        contains_starred=True,
+    )
+
+
+def test_node_summary_long_chain():
+    # `a0 + a1 + ... + a19999`, built directly as it is too deep for the
+    # parser of some versions.  quadratic work would take minutes
+    node: ast.expr = ast.Name('a0', ast.Load())
+    for i in range(1, 20000):
+        node = ast.BinOp(node, ast.Add(), ast.Name(f'a{i}', ast.Load()))
+    t0 = time.monotonic()
+    assert not contains_await(node)
+    assert time.monotonic() - t0 < 5
+
+
+def test_node_summary_is_cached():
+    node = _get_body('await x + y')
+    assert contains_await(node)
+    assert contains_await(node.left)
+    assert not contains_await(node.right)
+    assert node_summary(node.left) is node_summary(node.left)
+
+    with mock.patch.object(ast, 'iter_child_nodes') as iter_child_nodes:
+        assert contains_await(node)
+    iter_child_nodes.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ('s1', 's2', 'expected'),
+    (
+        ('x', 'x', True),
+        ('x.y[0]', 'x.y[0]', True),
+        ('(a, *b)', '(a, *b)', True),
+        ('x', 'y', False),
+        ('x.y[0]', 'x.y[1]', False),
+        ('(a, b)', '[a, b]', False),
+        ('(a, b)', '(a, b, c)', False),
+    ),
+)
+def test_structural_hash(s1, s2, expected):
+    n1, n2 = _get_body(s1), _get_body(s2)
+    assert ast_eq(n1, n2) is expected
+    if expected:
+        assert structural_hash(n1) == structural_hash(n2)
+
+
+def test_structural_hash_ignores_context():
+    stmt = ast.parse('x.y = 1').body[0]
+    assert isinstance(stmt, ast.Assign)
+    store = stmt.targets[0]
+    load = _get_body('x.y')
+    assert structural_hash(store) == structural_hash(load)
+    assert ast_eq(store, load)
+
+
+def test_ast_parse_ignores_callers_warning_filters():
+    before = warnings.filters[:]
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        ast_parse("x = '\\d'\n")
+        assert warnings.filters[0][0] == 'error'
+    assert warnings.filters == before
+
+
+def test_ast_parse_already_ignoring_warnings_does_not_lock():
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        with (
+                mock.patch.object(_ast_helpers, '_WARNINGS_LOCK') as lock,
+                mock.patch.object(warnings, 'catch_warnings') as catch,
+        ):
+            ast_parse("x = '\\d'\n")
+    lock.__enter__.assert_not_called()
+    catch.assert_not_called()
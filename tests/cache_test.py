@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import os
+import time
+from unittest import mock
+
+import pytest
+
+from pyupgrade._cache import Cache
+from pyupgrade._cache import main
+from pyupgrade._cache import Stats
+
+
+@pytest.fixture
+def cache(tmpdir):
+    ret = Cache(str(tmpdir.join('cache.db')))
+    yield ret
+    ret.close()
+
+
+def test_lookup_and_store(cache):
+    assert cache.lookup('k', {'a', 'b'}) == {}
+    cache.store('k', {'a': None, 'b': b'x = 1\n'})
+    cache.store('other', {'c': None})
+    assert cache.lookup('k', {'a', 'b', 'c'}) == {'a': None, 'b': b'x = 1\n'}
+    assert cache.lookup('other', {'a', 'c'}) == {'c': None}
+    assert cache.lookup('k', ()) == {}
+
+
+def test_wal_mode(cache):
+    mode, = cache.db.execute('PRAGMA journal_mode').fetchone()
+    assert mode == 'wal'
+
+
+def test_stats(cache):
+    cache.store('k', {'a': None, 'b': b'x = 1\n'})
+    cache.store('other', {'c': None})
+    assert cache.stats() == Stats(
+        entries=3,
+        clean=2,
+        rewritten=1,
+        settings=2,
+        size=os.path.getsize(cache.filename),
+    )
+
+
+def test_prune(cache):
+    now = time.time()
+    with mock.patch.object(time, 'time', return_value=now - 100):
+        cache.store('k', {'old': None})
+    cache.store('k', {'new': None})
+    assert cache.prune(50) == 1
+    assert cache.lookup('k', {'old', 'new'}) == {'new': None}
+
+
+def test_lookup_marks_used(cache):
+    now = time.time()
+    with mock.patch.object(time, 'time', return_value=now - 100):
+        cache.store('k', {'a': None, 'b': None})
+    cache.lookup('k', {'a'})
+    assert cache.prune(50) == 1
+    assert cache.lookup('k', {'a', 'b'}) == {'a': None}
+
+
+def test_export_and_merge(tmpdir, cache):
+    now = time.time()
+    with mock.patch.object(time, 'time', return_value=now - 100):
+        cache.store('k', {'a': None, 'b': b'old\n'})
+
+    other = Cache(str(tmpdir.join('other.db')))
+    other.store('k', {'b': b'new\n', 'c': None})
+    with mock.patch.object(time, 'time', return_value=now - 200):
+        other.store('k', {'a': b'older\n'})
+    other.close()
+
+    assert cache.merge(str(tmpdir.join('other.db'))) == 2
+    assert cache.lookup('k', {'a', 'b', 'c'}) == {
+        'a': None, 'b': b'new\n', 'c': None,
+    }
+
+    exported = str(tmpdir.join('exported.db'))
+    cache.export(exported)
+    copy = Cache(exported)
+    assert copy.lookup('k', {'a', 'b', 'c'}) == {
+        'a': None, 'b': b'new\n', 'c': None,
+    }
+    copy.close()
+
+
+def test_main(tmpdir, capsys):
+    db = str(tmpdir.join('cache.db'))
+    shard = str(tmpdir.join('shard.db'))
+    cache = Cache(shard)
+    cache.store('k', {'a': None, 'b': b'x = 1\n'})
+    cache.close()
+
+    assert main(('merge', db, shard)) == 0
+    assert main(('prune', db)) == 0
+    assert main(('export', db, str(tmpdir.join('export.db')))) == 0
+    assert main(('stats', db)) == 0
+    out, _ = capsys.readouterr()
+    assert out == (
+        f'{shard}: merged 2 entries\n'
+        f'removed 0 entries\n'
+        f'entries: 2\n'
+        f'clean: 1\n'
+        f'rewritten: 1\n'
+        f'settings: 1\n'
+        f'size: {os.path.getsize(db)}\n'
+    )
+
+
+def test_main_errors(tmpdir, capsys):
+    db = str(tmpdir.join('cache.db'))
+    assert main(('stats', db)) == 1
+    assert main(('merge', db, str(tmpdir.join('missing.db')))) == 1
+    Cache(db).close()
+    assert main(('export', db, db)) == 1
+    out, _ = capsys.readouterr()
+    assert out == (
+        f'{db}: no such cache\n'
+        f'{tmpdir.join("missing.db")}: no such cache\n'
+        f'{db}: already exists\n'
+    )
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+import ast
+import concurrent.futures
+import os.path
+import random
+import sys
+import warnings
+
+import pytest
+
+from pyupgrade._data import Settings
+from pyupgrade._main import _fix_contents
+
+FEATURES = os.path.join(os.path.dirname(__file__), 'features')
+SETTINGS = (
+    Settings(),
+    Settings(min_version=(3, 6)),
+    Settings(min_version=(3, 10), keep_runtime_typing=True),
+    Settings(min_version=(3, 14), keep_percent_format=True, keep_mock=True),
+)
+
+
+def _corpus() -> list[str]:
+    """every string in the feature tests which is valid python"""
+    ret = set()
+    for name in sorted(os.listdir(FEATURES)):
+        if not name.endswith('_test.py'):
+            continue
+        with open(os.path.join(FEATURES, name), encoding='UTF-8') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                try:
+                    with warnings.catch_warnings():
+                        warnings.simplefilter('ignore')
+                        ast.parse(node.value)
+                except SyntaxError:
+                    continue
+                else:
+                    ret.add(node.value)
+    return sorted(ret)
+
+
+@pytest.fixture
+def fast_switching():
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-5)
+    try:
+        yield
+    finally:
+        sys.setswitchinterval(interval)
+
+
+def test_concurrent_results_match_serial(fast_switching):
+    cases = [(s, settings) for s in _corpus() for settings in SETTINGS]
+    assert len(cases) > 1000
+    expected = [_fix_contents(s, settings=settings) for s, settings in cases]
+
+    order = list(range(len(cases)))
+    random.Random(0).shuffle(order)
+    with concurrent.futures.ThreadPoolExecutor(8) as executor:
+        futures = {
+            i: executor.submit(_fix_contents, *cases[i])
+            for i in order
+        }
+        actual = [futures[i].result() for i in range(len(cases))]
+
+    assert actual == expected
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import ast
+import collections
+import sys
+from unittest import mock
+
+from pyupgrade._data import ASTCallbackMapping
+from pyupgrade._data import iter_callbacks
+from pyupgrade._data import Settings
+from pyupgrade._data import settings_key
+
+
+def test_scopes_reads_and_writes():
+    src = (
+        'def f(a):\n'
+        '    b = a\n'
+        '    def g():\n'
+        '        return b + c\n'
+        '    return [d for d in b]\n'
+    )
+    seen = {}
+
+    def record_scope(state, node, parent):
+        scope = state.scopes[-1]
+
+        def _record():
+            seen[scope.node.name] = (dict(+scope.reads), scope.writes)
+            return ()
+
+        scope.exit_funcs.append(_record)
+        return ()
+
+    funcs: ASTCallbackMapping = collections.defaultdict(list)
+    funcs[ast.Return].append(record_scope)
+    tree = ast.parse(src)
+    assert list(iter_callbacks(funcs, tree, Settings())) == []
+    # `c` is a free variable of `g` so it counts as a read in `f` too
+    assert seen['g'] == ({'b': 1, 'c': 1}, set())
+    assert seen['f'] == ({'a': 1, 'b': 2, 'c': 1}, {'b'})
+
+
+def test_settings_key_depends_on_interpreter():
+    key = settings_key(Settings())
+    assert settings_key(Settings()) == key
+    assert settings_key(Settings(min_version=(3, 8))) != key
+    with mock.patch.object(sys, 'version_info', (3, 99, 0)):
+        assert settings_key(Settings()) != key
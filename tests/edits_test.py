@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import pytest
+
+from pyupgrade._edits import compute_edits
+from pyupgrade._edits import Edit
+from pyupgrade._edits import Position
+from pyupgrade._edits import split_lines
+
+
+def test_compute_edits_no_changes():
+    assert compute_edits('x = 1\n', 'x = 1\n') == []
+
+
+def test_compute_edits_single_line():
+    before = 'a = 1\nb = set((1, 2))\nc = 3\n'
+    after = 'a = 1\nb = {1, 2}\nc = 3\n'
+    assert compute_edits(before, after) == [
+        Edit(Position(1, 0), Position(2, 0), 'b = {1, 2}\n'),
+    ]
+
+
+def test_compute_edits_no_newline_at_end_of_file():
+    assert compute_edits('a = 1\nb = set(())', 'a = 1\nb = set()') == [
+        Edit(Position(1, 0), Position(1, 11), 'b = set()'),
+    ]
+
+
+def test_edit_to_json():
+    edit = Edit(Position(1, 0), Position(2, 0), 'b = {1, 2}\n')
+    assert edit.to_json() == {
+        'range': {
+            'start': {'line': 1, 'character': 0},
+            'end': {'line': 2, 'character': 0},
+        },
+        'newText': 'b = {1, 2}\n',
+    }
+
+
+def _apply_edits(s, edits):
+    lines = split_lines(s)
+    offsets = [0]
+    for line in lines:
+        offsets.append(offsets[-1] + len(line))
+
+    def _offset(position):
+        return offsets[position.line] + position.character
+
+    for edit in sorted(edits, reverse=True):
+        start, end = _offset(edit.start), _offset(edit.end)
+        s = s[:start] + edit.replacement + s[end:]
+    return s
+
+
+@pytest.mark.parametrize(
+    ('before', 'after'),
+    (
+        ('a\nb\nc\n', 'a\nc\n'),
+        ('a\nb\nc\n', 'x\nb\ny\n'),
+        ('a\r\nb\r\n', 'a\r\nc\r\nb\r\n'),
+        ('a\nb', 'a\nb\n'),
+        ('a\x0cb\nc\n', 'a\x0cb\nd\n'),
+        ('', 'x = 1\n'),
+        ('x = 1\n', ''),
+    ),
+)
+def test_apply_edits_round_trip(before, after):
+    assert _apply_edits(before, compute_edits(before, after)) == after
@@ -312,6 +312,47 @@ def test_mock_noop_keep_mock():
             'from collections.abc import Sequence as S\n',
             id='aliasing in multi from import',
         ),
+        pytest.param(
+            'import os\n'
+            'from collections import Mapping\n'
+            '# comment\n'
+            'import mock, sys\n'
+            'from six.moves import StringIO, getcwd\n'
+            'from io import open\n'
+            'x = 1\n',
+            (3,),
+            'import os\n'
+            'from collections.abc import Mapping\n'
+            '# comment\n'
+            'import sys\n'
+            'from unittest import mock\n'
+            'from io import StringIO\n'
+            'from os import getcwd\n'
+            'x = 1\n',
+            id='block of imports',
+        ),
+        pytest.param(
+            'if True:\n'
+            '    from collections import Mapping\n'
+            '    from six.moves import StringIO, getcwd\n'
+            '    import mock, sys\n',
+            (3,),
+            'if True:\n'
+            '    from collections.abc import Mapping\n'
+            '    from io import StringIO\n'
+            '    from os import getcwd\n'
+            '    import sys\n'
+            '    from unittest import mock\n',
+            id='indented block of imports',
+        ),
+        pytest.param(
+            'from six.moves import getcwd; from six.moves import StringIO\n'
+            'from collections import Mapping\n',
+            (3,),
+            'from os import getcwd; from io import StringIO\n'
+            'from collections.abc import Mapping\n',
+            id='block of imports with statements sharing a line',
+        ),
     ),
 )
 def test_import_replaces(s, min_version, expected):
@@ -671,6 +671,25 @@ def test_fix_py2_blocks(s, expected):
 
             'print(3)\n',
         ),
+        pytest.param(
+            'import six\n'
+            'import sys\n'
+            'if sys.version_info >= (3,):\n'
+            '    def f():\n'
+            '        if six.PY3:\n'
+            '            x = 1\n'
+            '    y = 2\n'
+            'z = 3\n',
+
+            'import six\n'
+            'import sys\n'
+            'def f():\n'
+            '    x = 1\n'
+            'y = 2\n'
+            'z = 3\n',
+
+            id='nested block dedented with its enclosing block',
+        ),
     ),
 )
 def test_fix_py3_only_code(s, expected):
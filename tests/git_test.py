@@ -0,0 +1,32 @@
+from __future__ import annotations
+
+import subprocess
+
+import pytest
+
+from pyupgrade._git import blob_id
+from pyupgrade._git import cat_blobs
+
+
+@pytest.mark.parametrize('contents', (b'', b'x = 1\n', b'\xe2\x98\x83\n'))
+def test_blob_id_matches_git(contents):
+    expected = subprocess.check_output(
+        ('git', 'hash-object', '--stdin'), input=contents,
+    ).decode().strip()
+    assert blob_id(contents) == expected
+
+
+def test_cat_blobs(tmpdir):
+    blobs = [b'', b'x = 1\n' * 10000, b'\n']
+    with tmpdir.as_cwd():
+        subprocess.check_call(('git', 'init', '-q'))
+        shas = [
+            subprocess.check_output(
+                ('git', 'hash-object', '-w', '--stdin'), input=contents,
+            ).decode().strip()
+            for contents in blobs
+        ]
+        assert list(cat_blobs(shas)) == list(zip(shas, blobs))
+
+        with pytest.raises(ValueError):
+            list(cat_blobs(['0' * 40]))
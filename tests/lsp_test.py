@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import io
+import json
+
+import pytest
+
+from pyupgrade._data import Settings
+from pyupgrade._lsp import apply_change
+from pyupgrade._lsp import read_message
+from pyupgrade._lsp import serve
+from pyupgrade._lsp import write_message
+from pyupgrade._main import _fix_contents
+
+URI = 'file:///t.py'
+
+
+def _fix(s):
+    return _fix_contents(s, settings=Settings())
+
+
+def _range(start, end):
+    return {
+        'start': {'line': start[0], 'character': start[1]},
+        'end': {'line': end[0], 'character': end[1]},
+    }
+
+
+def _run(*msgs):
+    stdin = io.BytesIO()
+    for msg in msgs:
+        write_message(stdin, {'jsonrpc': '2.0', **msg})
+    stdin.seek(0)
+    stdout = io.BytesIO()
+    ret = serve(_fix, stdin, stdout)
+    stdout.seek(0)
+    responses = []
+    while (body := read_message(stdout)) is not None:
+        responses.append(json.loads(body))
+    return ret, responses
+
+
+def _open(text):
+    return {
+        'method': 'textDocument/didOpen',
+        'params': {
+            'textDocument': {
+                'uri': URI, 'languageId': 'python', 'version': 1,
+                'text': text,
+            },
+        },
+    }
+
+
+def _formatting(msg_id):
+    return {
+        'id': msg_id,
+        'method': 'textDocument/formatting',
+        'params': {'textDocument': {'uri': URI}, 'options': {}},
+    }
+
+
+SHUTDOWN = ({'id': 99, 'method': 'shutdown'}, {'method': 'exit'})
+
+
+@pytest.mark.parametrize(
+    ('text', 'change', 'expected'),
+    (
+        pytest.param(
+            'x = 1\n', {'text': 'y = 2\n'}, 'y = 2\n',
+            id='full replacement',
+        ),
+        pytest.param(
+            'x = 1\ny = 2\n',
+            {'range': _range((1, 4), (1, 5)), 'text': '3'},
+            'x = 1\ny = 3\n',
+            id='incremental',
+        ),
+        pytest.param(
+            'x = 1\ny = 2\n',
+            {'range': _range((0, 5), (2, 0)), 'text': ''},
+            'x = 1',
+            id='incremental spanning lines',
+        ),
+        pytest.param(
+            's = "😀☃"\n',
+            {'range': _range((0, 7), (0, 8)), 'text': '!'},
+            's = "😀!"\n',
+            id='utf-16 positions',
+        ),
+        pytest.param(
+            'x = 1\n',
+            {'range': _range((0, 99), (5, 0)), 'text': '2\n'},
+            'x = 12\n',
+            id='out of range positions are clamped',
+        ),
+    ),
+)
+def test_apply_change(text, change, expected):
+    assert apply_change(text, change) == expected
+
+
+def test_initialize_and_shutdown():
+    ret, responses = _run(
+        {'id': 1, 'method': 'initialize', 'params': {'capabilities': {}}},
+        {'method': 'initialized', 'params': {}},
+        *SHUTDOWN,
+    )
+    assert ret == 0
+    assert [r['id'] for r in responses] == [1, 99]
+    capabilities = responses[0]['result']['capabilities']
+    assert capabilities['textDocumentSync']['change'] == 2
+    assert responses[1]['result'] is None
+
+
+def test_exit_without_shutdown():
+    ret, responses = _run({'method': 'exit'})
+    assert ret == 1
+    assert responses == []
+
+
+def test_formatting_after_incremental_change():
+    ret, responses = _run(
+        _open('s = "☃"\nx = 1\n'),
+        _formatting(1),
+        {
+            'method': 'textDocument/didChange',
+            'params': {
+                'textDocument': {'uri': URI, 'version': 2},
+                'contentChanges': [
+                    {'range': _range((1, 4), (1, 5)), 'text': 'set((1,))'},
+                ],
+            },
+        },
+        _formatting(2),
+        *SHUTDOWN,
+    )
+    assert ret == 0
+    assert responses[0]['result'] == []
+    assert responses[1]['result'] == [
+        {'range': _range((1, 0), (2, 0)), 'newText': 'x = {1}\n'},
+    ]
+
+
+def test_formatting_utf16_end_of_file():
+    _, responses = _run(_open('s = "😀"; x = set(())'), _formatting(1))
+    assert responses[0]['result'] == [
+        {'range': _range((0, 0), (0, 21)), 'newText': 's = "😀"; x = set()'},
+    ]
+
+
+def test_code_action():
+    params = {
+        'textDocument': {'uri': URI},
+        'range': _range((0, 0), (0, 0)),
+        'context': {'diagnostics': []},
+    }
+    quickfix_params = {**params, 'context': {'only': ['quickfix']}}
+    source_params = {**params, 'context': {'only': ['source']}}
+    _, responses = _run(
+        _open('x = set((1,))\n'),
+        {'id': 1, 'method': 'textDocument/codeAction', 'params': params},
+        {
+            'id': 2,
+            'method': 'textDocument/codeAction',
+            'params': quickfix_params,
+        },
+        {
+            'id': 3,
+            'method': 'textDocument/codeAction',
+            'params': source_params,
+        },
+    )
+    action = {
+        'title': 'Upgrade syntax (pyupgrade)',
+        'kind': 'source.fixAll.pyupgrade',
+        'edit': {
+            'changes': {
+                URI: [
+                    {'range': _range((0, 0), (1, 0)), 'newText': 'x = {1}\n'},
+                ],
+            },
+        },
+    }
+    assert responses[0]['result'] == [action]
+    assert responses[1]['result'] == []
+    assert responses[2]['result'] == [action]
+
+
+def test_code_action_no_changes():
+    params = {'textDocument': {'uri': URI}, 'context': {}}
+    _, responses = _run(
+        _open('x = {1}\n'),
+        {'id': 1, 'method': 'textDocument/codeAction', 'params': params},
+    )
+    assert responses[0]['result'] == []
+
+
+def test_closed_document():
+    _, responses = _run(
+        _open('x = 1\n'),
+        {
+            'method': 'textDocument/didClose',
+            'params': {'textDocument': {'uri': URI}},
+        },
+        _formatting(1),
+    )
+    assert responses[0]['error'] == {
+        'code': -32602, 'message': f'unknown document: {URI}',
+    }
+
+
+def test_errors():
+    stdin = io.BytesIO()
+    stdin.write(b'Content-Length: 3\r\n\r\n{{{')
+    stdin.write(b'Content-Type: foo\r\n\r\n')
+    write_message(stdin, {'jsonrpc': '2.0', 'id': 1, 'method': 'wat'})
+    write_message(stdin, {'jsonrpc': '2.0', 'method': 'wat'})
+    write_message(
+        stdin,
+        {'jsonrpc': '2.0', 'method': 'textDocument/didChange', 'params': {}},
+    )
+    write_message(
+        stdin,
+        {'jsonrpc': '2.0', 'id': 2, 'method': 'textDocument/formatting'},
+    )
+    stdin.seek(0)
+    stdout = io.BytesIO()
+    assert serve(_fix, stdin, stdout) == 1
+    stdout.seek(0)
+    responses = []
+    while (body := read_message(stdout)) is not None:
+        responses.append(json.loads(body))
+    assert [(r['id'], r['error']['code']) for r in responses] == [
+        (None, -32700),
+        (None, -32700),
+        (1, -32601),
+        (2, -32603),
+    ]
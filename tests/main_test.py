@@ -1,13 +1,25 @@
 from __future__ import annotations
 
 import io
+import itertools
+import json
+import os
 import re
+import subprocess
 import sys
+import time
+import warnings
+import zipfile
 from unittest import mock
 
 import pytest
 
+from pyupgrade import _ast_helpers
+from pyupgrade import _main
+from pyupgrade import _schedule
+from pyupgrade._git import normpath
 from pyupgrade._main import main
+from pyupgrade._main import reduce_main
 
 
 def test_main_trivial():
@@ -198,3 +210,685 @@ def test_main_stdin_with_changes(capsys):
         assert main(('-',)) == 1
     out, err = capsys.readouterr()
     assert out == '{1, 2}\n'
+
+
+def _git(*cmd, cwd):
+    subprocess.check_call(('git', '-C', str(cwd), *cmd))
+
+
+@pytest.fixture
+def git_repo(tmpdir):
+    _git('init', '-q', cwd=tmpdir)
+    _git('config', 'user.name', 'pyupgrade', cwd=tmpdir)
+    _git('config', 'user.email', 'pyupgrade@example.com', cwd=tmpdir)
+    yield tmpdir
+
+
+def test_git_index_cache_skips_clean_files(git_repo):
+    clean = git_repo.join('clean.py')
+    clean.write('x = {1, 2}\n')
+    dirty = git_repo.join('dirty.py')
+    dirty.write('x = set((1, 2))\n')
+    _git('add', '.', cwd=git_repo)
+
+    with git_repo.as_cwd():
+        assert main(('--git-index-cache', 'clean.py', 'dirty.py')) == 1
+        assert dirty.read() == 'x = {1, 2}\n'
+
+        with mock.patch.object(_main, '_fix_file', return_value=0) as fix:
+            assert main(('--git-index-cache', 'clean.py', 'dirty.py')) == 0
+        # clean.py is skipped without reading, dirty.py was modified
+        assert [c.args for c in fix.call_args_list] == [('dirty.py',)]
+
+        # settings are part of the cache key
+        with mock.patch.object(_main, '_fix_file', return_value=0) as fix:
+            main(('--git-index-cache', '--py36-plus', 'clean.py'))
+        assert [c.args for c in fix.call_args_list] == [('clean.py',)]
+
+
+def test_git_index_cache_paths_relative_to_cwd(git_repo):
+    git_repo.join('pkg').ensure_dir()
+    f = git_repo.join('pkg/f.py')
+    f.write('x = {1, 2}\n')
+    g = git_repo.join('g.py')
+    g.write('x = {1, 2}\n')
+    _git('add', '.', cwd=git_repo)
+
+    with git_repo.join('pkg').as_cwd():
+        assert main(('--git-index-cache', 'f.py', '../g.py')) == 0
+        with mock.patch.object(_main, '_fix_file', return_value=0) as fix:
+            args = ('./f.py', str(g), str(git_repo.join('h.py')))
+            assert main(('--git-index-cache', *args)) == 0
+    # only the untracked file is read
+    assert [c.args for c in fix.call_args_list] == [(args[2],)]
+
+
+def test_git_index_cache_not_a_repo(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('x = set((1, 2))\n')
+    with tmpdir.as_cwd(), mock.patch.dict(os.environ, GIT_DIR=str(tmpdir)):
+        assert main(('--git-index-cache', 'f.py')) == 1
+    _, err = capsys.readouterr()
+    assert '--git-index-cache: not a git repository, ignoring' in err
+    assert f.read() == 'x = {1, 2}\n'
+
+
+def test_main_git_rev(git_repo, capsys):
+    git_repo.join('a.py').write('x = set((1,))\n')
+    git_repo.join('b.py').write('x = 1\n')
+    git_repo.join('pkg').ensure_dir()
+    git_repo.join('pkg/c.py').write('x = set((1,))\n')
+    git_repo.join('pkg/d.txt').write('x = set((1,))\n')
+    _git('add', '.', cwd=git_repo)
+    _git('commit', '-q', '-m', 'initial', cwd=git_repo)
+    # the working tree is not used
+    git_repo.join('b.py').write('x = set((1,))\n')
+
+    with git_repo.as_cwd():
+        with mock.patch.object(
+                _main, '_fix_contents', wraps=_main._fix_contents,
+        ) as fix_contents:
+            assert main(('--git-rev', 'HEAD')) == 1
+        # a.py and pkg/c.py have the same contents
+        assert fix_contents.call_count == 2
+        patch, _ = capsys.readouterr()
+        assert patch == (
+            '--- a/a.py\n'
+            '+++ b/a.py\n'
+            '@@ -1 +1 @@\n'
+            '-x = set((1,))\n'
+            '+x = {1}\n'
+            '--- a/pkg/c.py\n'
+            '+++ b/pkg/c.py\n'
+            '@@ -1 +1 @@\n'
+            '-x = set((1,))\n'
+            '+x = {1}\n'
+        )
+
+        _git('checkout', '-q', '--', 'b.py', cwd=git_repo)
+        subprocess.run(
+            ('git', 'apply'), input=patch.encode(), check=True,
+        )
+        assert git_repo.join('pkg/c.py').read() == 'x = {1}\n'
+
+        with git_repo.join('pkg').as_cwd():
+            assert main(('--check', '--git-rev', 'HEAD~0', '.')) == 1
+        _, err = capsys.readouterr()
+        assert err == 'Would rewrite pkg/c.py\n'
+
+
+def test_main_git_rev_invalid(git_repo, capsys):
+    with git_repo.as_cwd():
+        assert main(('--git-rev', 'nope')) == 1
+    _, err = capsys.readouterr()
+    assert err.startswith('--git-rev: fatal: ')
+
+
+def test_main_check_does_not_write(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('x = set((1, 2))\n')
+    g = tmpdir.join('g.py')
+    g.write('x = {1, 2}\n')
+    assert main(('--check', str(f), str(g))) == 1
+    assert f.read() == 'x = set((1, 2))\n'
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert err == f'Would rewrite {f}\n'
+
+
+def test_main_diff(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('x = 1\ny = set((1, 2))')
+    assert main(('--diff', str(f))) == 1
+    assert f.read() == 'x = 1\ny = set((1, 2))'
+    out, err = capsys.readouterr()
+    assert out == (
+        f'--- a/{f}\n'
+        f'+++ b/{f}\n'
+        f'@@ -1,2 +1,2 @@\n'
+        f' x = 1\n'
+        f'-y = set((1, 2))\n'
+        f'\\ No newline at end of file\n'
+        f'+y = {{1, 2}}\n'
+        f'\\ No newline at end of file\n'
+    )
+    assert err == ''
+
+
+def test_main_diff_non_utf8(tmpdir, capsys):
+    bad = tmpdir.join('bad.py')
+    bad.write_binary(b'# -*- coding: cp1252 -*-\nx = "\x96"\n')
+    f = tmpdir.join('f.py')
+    f.write('x = set((1, 2))\n')
+    assert main(('--diff', str(bad), str(f))) == 1
+    out, err = capsys.readouterr()
+    assert out.startswith(f'--- a/{f}\n')
+    assert err == f'{bad} is non-utf-8 (not supported)\n'
+
+
+def test_main_diff_stdin(capsys):
+    stdin = io.TextIOWrapper(io.BytesIO(b'set((1, 2))\n'), 'UTF-8')
+    with mock.patch.object(sys, 'stdin', stdin):
+        assert main(('--diff', '-')) == 1
+    out, _ = capsys.readouterr()
+    assert out == (
+        '--- a/-\n'
+        '+++ b/-\n'
+        '@@ -1 +1 @@\n'
+        '-set((1, 2))\n'
+        '+{1, 2}\n'
+    )
+
+
+def test_main_fail_fast(tmpdir, capsys):
+    files = [tmpdir.join(f'f{i}.py') for i in range(3)]
+    for f in files:
+        f.write('x = set((1, 2))\n')
+    assert main(('--check', '--fail-fast', *map(str, files))) == 1
+    _, err = capsys.readouterr()
+    assert err == f'Would rewrite {files[0]}\n'
+
+
+def test_main_report_json(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write(
+        'class C(object):\n'
+        '    def f(self):\n'
+        '        return set((1, 2))\n',
+    )
+    g = tmpdir.join('g.py')
+    g.write('x = 1\n')
+    assert main(('--report', 'json', str(f), str(g))) == 1
+    assert f.read().startswith('class C(object):')
+    out, _ = capsys.readouterr()
+    assert [json.loads(line) for line in out.splitlines()] == [
+        dict(filename=str(f), line=1, col=8, plugin='new_style_classes'),
+        dict(filename=str(f), line=3, col=15, plugin='set_literals'),
+    ]
+
+
+def test_main_report_json_syntax_error(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('print 1\n')
+    assert main(('--report', 'json', str(f))) == 0
+    out, _ = capsys.readouterr()
+    assert out == ''
+
+
+def test_main_report_json_non_ascii(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write_binary('s = "☃"\nclass C(object): pass\n'.encode())
+    assert main(('--report', 'json', str(f))) == 1
+    out, _ = capsys.readouterr()
+    assert json.loads(out) == {
+        'filename': str(f),
+        'line': 2,
+        'col': 8,
+        'plugin': 'new_style_classes',
+    }
+
+
+def test_main_report_non_utf8(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write_binary('# -*- coding: cp1252 -*-\nx = "€"\n'.encode('cp1252'))
+    assert main(('--report', 'json', str(f))) == 1
+    _, err = capsys.readouterr()
+    assert err == f'{f} is non-utf-8 (not supported)\n'
+
+
+def test_main_report_targets(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write(
+        'from typing import List\n'
+        'x: List[int] = set((1, 2))\n'
+        '"{}".format(x)\n',
+    )
+    assert main(('--report', 'targets', str(f))) == 1
+    out, _ = capsys.readouterr()
+    ret = json.loads(out)
+    assert ret['filename'] == str(f)
+    assert ret['counts']['py3-plus'] == 1
+    assert ret['counts']['py36-plus'] == 2
+    assert ret['counts']['py39-plus'] == 3
+    assert list(ret['counts']) == [
+        'py3-plus', 'py36-plus', 'py37-plus', 'py38-plus', 'py39-plus',
+        'py310-plus', 'py311-plus', 'py312-plus', 'py313-plus',
+        'py314-plus', 'py315-plus',
+    ]
+
+
+def test_main_edits(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('x = 1\ny = set((1, 2))\n')
+    g = tmpdir.join('g.py')
+    g.write('x = 1\n')
+    assert main(('--edits', str(f), str(g))) == 1
+    assert f.read() == 'x = 1\ny = set((1, 2))\n'
+    out, _ = capsys.readouterr()
+    assert json.loads(out) == {
+        'filename': str(f),
+        'edits': [
+            {
+                'range': {
+                    'start': {'line': 1, 'character': 0},
+                    'end': {'line': 2, 'character': 0},
+                },
+                'newText': 'y = {1, 2}\n',
+            },
+        ],
+    }
+
+
+def test_main_edits_non_utf8(tmpdir, capsys):
+    bad = tmpdir.join('bad.py')
+    bad.write_binary(b'# -*- coding: cp1252 -*-\nx = "\x96"\n')
+    f = tmpdir.join('f.py')
+    f.write('x = set((1, 2))\n')
+    assert main(('--edits', str(bad), str(f))) == 1
+    out, err = capsys.readouterr()
+    assert [json.loads(line)['filename'] for line in out.splitlines()] == [
+        str(f),
+    ]
+    assert err == f'{bad} is non-utf-8 (not supported)\n'
+
+
+def test_main_edits_stdin_no_changes(capsys):
+    stdin = io.TextIOWrapper(io.BytesIO(b'{1, 2}\n'), 'UTF-8')
+    with mock.patch.object(sys, 'stdin', stdin):
+        assert main(('--edits', '-')) == 0
+    out, _ = capsys.readouterr()
+    assert json.loads(out) == {'filename': '-', 'edits': []}
+
+
+def test_main_stats(tmpdir, capsys):
+    for func in _main._LITERAL_CACHES:
+        func.cache_clear()
+    f = tmpdir.join('f.py')
+    f.write("x = u'foo'\n")
+    g = tmpdir.join('g.py')
+    g.write("y = u'foo'\n")
+    assert main(('--stats', str(f), str(g))) == 1
+    assert f.read() == "x = 'foo'\n"
+    assert g.read() == "y = 'foo'\n"
+    _, err = capsys.readouterr()
+    assert err.splitlines()[-2:] == [
+        'string literal cache: 1 hits, 1 misses (50.0% hit rate)',
+        'identical contents: 0 file(s) reused a result',
+    ]
+
+
+def test_main_files_from(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x = set((1, 2))\n')
+    g = tmpdir.join('g py.py')
+    g.write('y = set((1, 2))\n')
+    files = tmpdir.join('files')
+    files.write_binary(f'{f}\0{g}\0'.encode())
+    assert main(('--files-from', str(files))) == 1
+    assert f.read() == 'x = {1, 2}\n'
+    assert g.read() == 'y = {1, 2}\n'
+
+
+def test_main_files_from_stdin(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x = set((1, 2))\n')
+    stdin = io.TextIOWrapper(io.BytesIO(f'{f}\0'.encode()), 'UTF-8')
+    with mock.patch.object(sys, 'stdin', stdin):
+        assert main(('--files-from', '-')) == 1
+    assert f.read() == 'x = {1, 2}\n'
+
+
+def test_main_files_from_stdin_and_stdin_file(capsys):
+    with pytest.raises(SystemExit):
+        main(('--files-from', '-', '-'))
+    _, err = capsys.readouterr()
+    assert 'cannot read both --files-from and a file from stdin' in err
+
+
+def test_main_response_file(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x = set((1, 2))\n')
+    args = tmpdir.join('args')
+    args.write(f'--check\n{f}\n')
+    assert main((f'@{args}',)) == 1
+    assert f.read() == 'x = set((1, 2))\n'
+
+
+def test_main_watch(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('x = set((1, 2))\n')
+    with mock.patch('time.sleep', side_effect=KeyboardInterrupt):
+        assert main(('--watch', str(tmpdir))) == 0
+    assert f.read() == 'x = {1, 2}\n'
+
+
+def test_main_watch_with_filenames(capsys):
+    with pytest.raises(SystemExit):
+        main(('--watch', '.', 'f.py'))
+    _, err = capsys.readouterr()
+    assert '--watch cannot be combined with filenames' in err
+
+
+def test_main_lsp(capsysbinary):
+    msg = b'{"jsonrpc":"2.0","method":"exit"}'
+    stdin = io.TextIOWrapper(
+        io.BytesIO(b'Content-Length: %d\r\n\r\n%s' % (len(msg), msg)),
+        'UTF-8',
+    )
+    with mock.patch.object(sys, 'stdin', stdin):
+        assert main(('--lsp',)) == 1
+    out, _ = capsysbinary.readouterr()
+    assert out == b''
+
+
+def test_main_lsp_with_filenames(capsys):
+    with pytest.raises(SystemExit):
+        main(('--lsp', 'f.py'))
+    _, err = capsys.readouterr()
+    assert '--lsp cannot be combined with filenames' in err
+
+
+def test_main_jobs(tmpdir, capsys):
+    files = []
+    for i in range(20):
+        f = tmpdir.join(f'f{i}.py')
+        f.write(f'x = set(({i},))\n' if i % 2 else f'x = {i}\n')
+        files.append(f)
+    assert main(('--jobs', '4', '--check', *map(str, files))) == 1
+    _, err = capsys.readouterr()
+    assert err == ''.join(
+        f'Would rewrite {f}\n' for i, f in enumerate(files) if i % 2
+    )
+
+
+def test_main_jobs_fail_fast(tmpdir, capsys):
+    files = []
+    for i in range(100):
+        f = tmpdir.join(f'f{i}.py')
+        f.write('x = set((1,))\n')
+        files.append(f)
+    assert main(('-j', '2', '--fail-fast', *map(str, files))) == 1
+    _, err = capsys.readouterr()
+    rewritten = err.splitlines()
+    assert rewritten[0] == f'Rewriting {files[0]}'
+    # the rest of the queue was cancelled
+    assert len(rewritten) < len(files)
+    assert sum(f.read() == 'x = {1}\n' for f in files) == len(rewritten)
+
+
+def test_main_jobs_fail_fast_small_file_first(tmpdir, capsys):
+    # the small first file is scheduled last, the failures must still stop
+    # the rest of the run
+    small = tmpdir.join('small.py')
+    small.write('x = 1\n')
+    files = []
+    for i in range(200):
+        f = tmpdir.join(f'f{i}.py')
+        f.write('x = set((1,))\n' + '# padding\n' * 100)
+        files.append(f)
+    args = ('--check', '--fail-fast', '-j', '4', str(small), *map(str, files))
+    assert main(args) == 1
+    _, err = capsys.readouterr()
+    assert 1 <= len(err.splitlines()) < 20
+
+
+def test_main_jobs_invalid(capsys):
+    with pytest.raises(SystemExit):
+        main(('--jobs', '0'))
+    _, err = capsys.readouterr()
+    assert '--jobs must be at least 1' in err
+
+
+def test_main_max_file_bytes(tmpdir, capsys):
+    small = tmpdir.join('small.py')
+    small.write('x = set((1,))\n')
+    big = tmpdir.join('big.py')
+    big.write('x = set((1,))\n' * 10)
+    assert main(('--max-file-bytes', '100', str(big), str(small))) == 1
+    assert small.read() == 'x = {1}\n'
+    assert big.read() == 'x = set((1,))\n' * 10
+    _, err = capsys.readouterr()
+    assert err == (
+        f'Rewriting {small}\n'
+        f'skipped 1 file(s) larger than --max-file-bytes:\n'
+        f'  {big}\n'
+    )
+
+
+def test_main_max_file_bytes_report(tmpdir, capsys):
+    big = tmpdir.join('big.py')
+    big.write('x = set((1,))\n' * 10)
+    assert main(('--report', 'json', '--max-file-bytes', '100', str(big))) == 0
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert err == (
+        f'skipped 1 file(s) larger than --max-file-bytes:\n'
+        f'  {big}\n'
+    )
+
+
+@pytest.mark.parametrize('report', ((), ('--report', 'json')))
+def test_main_per_file_timeout(tmpdir, capsys, report):
+    f = tmpdir.join('f.py')
+    f.write('x = set((1,))\n')
+    # every check of the clock sees another second pass
+    with mock.patch.object(time, 'monotonic', side_effect=itertools.count()):
+        assert main((*report, '--per-file-timeout', '.5', str(f))) == 0
+    assert f.read() == 'x = set((1,))\n'
+    out, err = capsys.readouterr()
+    assert out == ''
+    assert err == (
+        f'skipped 1 file(s) took longer than --per-file-timeout:\n'
+        f'  {f}\n'
+    )
+
+
+@pytest.mark.parametrize('jobs', ('1', '4'))
+def test_main_identical_contents(tmpdir, capsys, jobs):
+    files = [tmpdir.join(f'f{i}.py') for i in range(6)]
+    for f in files:
+        f.write('x = set((1,))\n')
+    other = tmpdir.join('other.py')
+    other.write('y = 1\n')
+    filenames = [*map(str, files), str(other)]
+    with mock.patch.object(
+            _main, '_fix_contents', wraps=_main._fix_contents,
+    ) as fix_contents:
+        assert main(('--jobs', jobs, '--stats', *filenames)) == 1
+    assert fix_contents.call_count == 2
+    for f in files:
+        assert f.read() == 'x = {1}\n'
+    _, err = capsys.readouterr()
+    assert err.splitlines()[:6] == [f'Rewriting {f}' for f in files]
+    assert err.splitlines()[-1] == (
+        'identical contents: 5 file(s) reused a result'
+    )
+
+
+def test_main_identical_contents_timeout(tmpdir, capsys):
+    files = [tmpdir.join(f'f{i}.py') for i in range(2)]
+    for f in files:
+        f.write('x = set((1,))\n')
+    with mock.patch.object(time, 'monotonic', side_effect=itertools.count()):
+        assert main(('--per-file-timeout', '.5', *map(str, files))) == 0
+    _, err = capsys.readouterr()
+    assert err == (
+        f'skipped 2 file(s) took longer than --per-file-timeout:\n'
+        f'  {files[0]}\n'
+        f'  {files[1]}\n'
+    )
+
+
+@pytest.mark.parametrize('jobs', ('1', '2'))
+def test_main_history(tmpdir, jobs):
+    f = tmpdir.join('f.py')
+    f.write('x = set((1,))\n')
+    g = tmpdir.join('g.py')
+    g.write('y = 1\n')
+    history = tmpdir.join('history')
+    history.write(json.dumps({str(tmpdir.join('gone.py')): 1.}))
+    args = ('--jobs', jobs, '--history', str(history), str(f), str(g))
+    assert main(args) == 1
+    recorded = json.loads(history.read())
+    assert sorted(recorded) == sorted(normpath(str(p)) for p in (f, g))
+    assert all(isinstance(v, float) for v in recorded.values())
+
+
+def test_main_jobs_parse_without_lock(tmpdir):
+    files = []
+    for i in range(4):
+        f = tmpdir.join(f'f{i}.py')
+        f.write("x = set(('\\d',))\n")
+        files.append(str(f))
+    with mock.patch.object(_ast_helpers, '_WARNINGS_LOCK') as lock:
+        assert main(('--jobs', '2', *files)) == 1
+    lock.__enter__.assert_not_called()
+    assert tmpdir.join('f0.py').read() == "x = {r'\\d'}\n"
+
+
+@pytest.mark.parametrize('jobs', ('1', '2'))
+def test_main_no_history_does_not_resolve_paths(tmpdir, jobs):
+    f = tmpdir.join('f.py')
+    f.write('x = set((1,))\n')
+    g = tmpdir.join('g.py')
+    g.write('y = 1\n')
+    with (
+            mock.patch.object(_main, 'normpath') as main_normpath,
+            mock.patch.object(_schedule, 'normpath') as schedule_normpath,
+    ):
+        assert main(('--jobs', jobs, str(f), str(g))) == 1
+    main_normpath.assert_not_called()
+    schedule_normpath.assert_not_called()
+
+
+@pytest.mark.parametrize('jobs', ('1', '2'))
+def test_main_shard(tmpdir, capsys, jobs):
+    files = []
+    for i in range(10):
+        f = tmpdir.join(f'f{i}.py')
+        f.write('x = set((1,))\n' if i % 2 else 'x = 1\n')
+        files.append(str(f))
+    reports = [str(tmpdir.join(f'results{k}.json')) for k in (1, 2, 3)]
+    for k, report in enumerate(reports, 1):
+        main((
+            '--jobs', jobs, '--check', '--shard', f'{k}/3',
+            '--results-json', report, *files,
+        ))
+    capsys.readouterr()
+
+    assert main(('--merge-reports', *reports)) == 1
+    out, _ = capsys.readouterr()
+    assert json.loads(out) == {
+        'returncode': 1, 'files': 10, 'failed': sorted(files[1::2]),
+    }
+
+
+def test_main_shard_errors(capsys):
+    with pytest.raises(SystemExit):
+        main(('--shard', '4/3', 'f.py'))
+    with pytest.raises(SystemExit):
+        main(('--shard-by-size', 'f.py'))
+    with pytest.raises(SystemExit):
+        main(('--merge-reports', 'r.json', '--', 'f.py'))
+
+
+def test_main_archive(tmpdir, capsys):
+    archive = tmpdir.join('pkg.zip')
+    with zipfile.ZipFile(str(archive), 'w') as zf:
+        zf.writestr('pkg/a.py', 'x = set((1,))\n')
+        zf.writestr('pkg/b.py', 'x = 1\n')
+        zf.writestr('pkg/c.py', b'\xff')
+
+    assert main(('--check', str(archive))) == 1
+    out, err = capsys.readouterr()
+    assert out == f'{archive}/pkg/c.py is non-utf-8 (not supported)\n'
+    assert err == f'Would rewrite {archive}/pkg/a.py\n'
+
+    assert main((str(archive),)) == 1
+    _, err = capsys.readouterr()
+    assert err == f'Rewriting {archive}/pkg/a.py\n'
+    with zipfile.ZipFile(str(archive)) as zf:
+        assert zf.read('pkg/a.py') == b'x = {1}\n'
+
+
+def test_main_archive_invalid(tmpdir, capsys):
+    archive = tmpdir.join('pkg.tar.gz')
+    archive.write('not a tar')
+    assert main((str(archive),)) == 1
+    _, err = capsys.readouterr()
+    assert err.startswith(f'{archive}: not a valid archive (')
+
+    assert main(('--report', 'json', str(archive))) == 1
+    _, err = capsys.readouterr()
+    assert err == f'{archive}: --report does not support archives\n'
+
+
+def _slow_fix_contents(contents_text, settings):
+    if 'set((' in contents_text:
+        time.sleep(.02)
+    return contents_text
+
+
+def test_main_reduce(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('import os\n\nx = [1, set((2,)), 3]\nprint(x)\n')
+    out = tmpdir.join('out.py')
+    with mock.patch.object(_main, '_fix_contents', _slow_fix_contents):
+        args = (str(f), '--slower-than', '10ms', '-o', str(out))
+        assert reduce_main(args) == 0
+    assert out.read() == 'x = [set((2,))]\n'
+    _, err = capsys.readouterr()
+    assert err == f'reduced {f} from 42 to 16 bytes\n'
+
+
+def test_main_reduce_not_slow(tmpdir, capsys):
+    f = tmpdir.join('f.py')
+    f.write('x = 1\n')
+    assert reduce_main((str(f), '--slower-than', '10s')) == 1
+    _, err = capsys.readouterr()
+    assert err == f'{f}: not slower than 10.0s\n'
+
+
+def test_main_warnings_as_errors(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write("x = set((1, 2))\ny = '\\d'\n")
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        assert main((str(f),)) == 1
+    assert f.read() == "x = {1, 2}\ny = r'\\d'\n"
+
+
+def test_main_cache(tmpdir, capsys):
+    db = str(tmpdir.join('cache.db'))
+    dirty = tmpdir.join('dirty.py')
+    dirty.write('x = set((1,))\n')
+    clean = tmpdir.join('clean.py')
+    clean.write('x = 1\n')
+    assert main(('--cache', db, str(dirty), str(clean))) == 1
+    assert dirty.read() == 'x = {1}\n'
+
+    dirty2 = tmpdir.join('dirty2.py')
+    dirty2.write('x = set((1,))\n')
+    capsys.readouterr()
+    with mock.patch.object(_main, '_fix_contents') as fix_contents:
+        assert main(('--cache', db, str(dirty2), str(clean))) == 1
+    fix_contents.assert_not_called()
+    assert dirty2.read() == 'x = {1}\n'
+    _, err = capsys.readouterr()
+    assert err == f'Rewriting {dirty2}\n'
+
+
+def test_main_cache_is_a_filename(tmpdir, capsys):
+    f = tmpdir.join('cache')
+    f.write('x = set((1,))\n')
+    with tmpdir.as_cwd():
+        assert main(('cache',)) == 1
+    assert f.read() == 'x = {1}\n'
+
+
+def test_main_reduce_is_a_filename(tmpdir, capsys):
+    f = tmpdir.join('reduce')
+    f.write('x = set((1,))\n')
+    with tmpdir.as_cwd():
+        assert main(('reduce',)) == 1
+    assert f.read() == 'x = {1}\n'
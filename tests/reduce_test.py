@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import argparse
+import time
+
+import pytest
+
+from pyupgrade._deadline import check_deadline
+from pyupgrade._reduce import _ddmin
+from pyupgrade._reduce import parse_duration
+from pyupgrade._reduce import reduce
+from pyupgrade._reduce import slower_than
+
+
+@pytest.mark.parametrize(
+    ('s', 'expected'),
+    (('2s', 2.), ('500ms', .5), ('1.5', 1.5), ('2m', 120.)),
+)
+def test_parse_duration(s, expected):
+    assert parse_duration(s) == expected
+
+
+@pytest.mark.parametrize('s', ('', 's', 'fast', '0s', '-1'))
+def test_parse_duration_invalid(s):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_duration(s)
+
+
+def test_ddmin():
+    assert _ddmin(10, lambda kept: {3, 7} <= set(kept)) == [3, 7]
+    assert _ddmin(10, lambda kept: True) == []
+    assert _ddmin(1, lambda kept: bool(kept)) == [0]
+
+
+def _slow_fix(contents_text):
+    if 'set((' in contents_text:
+        time.sleep(.02)
+    return contents_text
+
+
+def test_slower_than():
+    is_slow = slower_than(_slow_fix, .01)
+    assert is_slow(b'x = set((1,))\n')
+    assert not is_slow(b'x = 1\n')
+    # only sources which still parse count
+    assert not is_slow(b'x = set((1,)\n')
+
+
+def test_slower_than_stops_at_deadline():
+    def fix(contents_text):
+        while True:
+            check_deadline()
+
+    assert slower_than(fix, .01)(b'x = 1\n')
+
+
+def test_reduce():
+    src = (
+        b'#!/usr/bin/env python\n'
+        b'import os\n'
+        b'\n'
+        b'# a comment\n'
+        b'def f(a, b):\n'
+        b'    print(a)\n'
+        b'    return g(1, {"k": [2, set((3,))]}, key=4)\n'
+        b'\n'
+        b'x = 1; y = 2\n'
+    )
+
+    def is_slow(contents):
+        return b'set((3' in contents and b'def f' in contents
+
+    assert reduce(src, is_slow) == (
+        b'def f(a, b):\n'
+        b'    return g({"k": [set((3,))]})\n'
+    )
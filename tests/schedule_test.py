@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import pytest
+
+from pyupgrade._git import normpath
+from pyupgrade._schedule import largest_first
+from pyupgrade._schedule import load_history
+from pyupgrade._schedule import save_history
+
+
+def test_load_history_missing(tmpdir):
+    assert load_history(str(tmpdir.join('history'))) == {}
+
+
+@pytest.mark.parametrize(
+    ('contents', 'expected'),
+    (
+        ('{', {}),
+        ('[1, 2]', {}),
+        ('{"a": "b", "c": 1.5}', {'c': 1.5}),
+    ),
+)
+def test_load_history_invalid(tmpdir, contents, expected):
+    history = tmpdir.join('history')
+    history.write(contents)
+    assert load_history(str(history)) == expected
+
+
+def test_save_history_round_trip(tmpdir):
+    f = tmpdir.join('f.py').ensure()
+    g = tmpdir.join('g.py').ensure()
+    history = str(tmpdir.join('history'))
+    gone = str(tmpdir.join('gone.py'))
+    save_history(history, {str(f): 1., gone: 2.}, {str(g): 3.})
+    assert load_history(history) == {str(f): 1., str(g): 3.}
+
+
+def test_largest_first_by_size(tmpdir):
+    filenames = []
+    for name, size in (('a', 10), ('b', 1000), ('c', 100), ('d', 100)):
+        f = tmpdir.join(f'{name}.py')
+        f.write('x' * size)
+        filenames.append(str(f))
+    # ties keep their original order
+    assert largest_first(filenames, {}) == [1, 2, 3, 0]
+
+
+def test_largest_first_with_history(tmpdir):
+    filenames = []
+    for name, size in (('a', 10), ('b', 1000), ('c', 100)):
+        f = tmpdir.join(f'{name}.py')
+        f.write('x' * size)
+        filenames.append(str(f))
+    # recorded durations are used as-is, sizes are converted to seconds at
+    # the rate of the files which have a recorded duration
+    history = {normpath(filenames[0]): 1., normpath(filenames[2]): .5}
+    assert largest_first(filenames, history) == [1, 0, 2]
+    history = {normpath(filenames[0]): 1.}
+    assert largest_first(filenames, history) == [1, 2, 0]
+
+
+def test_largest_first_missing_file(tmpdir):
+    f = tmpdir.join('f.py')
+    f.write('x = 1\n')
+    assert largest_first([str(tmpdir.join('missing.py')), str(f)], {}) == [
+        1, 0,
+    ]
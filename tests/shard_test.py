@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import argparse
+import json
+
+import pytest
+
+from pyupgrade._shard import merge_reports
+from pyupgrade._shard import parse_shard
+from pyupgrade._shard import select
+from pyupgrade._shard import Shard
+from pyupgrade._shard import write_results
+
+
+def test_parse_shard():
+    assert parse_shard('2/3') == Shard(2, 3)
+    assert str(Shard(2, 3)) == '2/3'
+
+
+@pytest.mark.parametrize('s', ('', '2', 'a/b', '0/3', '4/3', '1/0'))
+def test_parse_shard_invalid(s):
+    with pytest.raises(argparse.ArgumentTypeError):
+        parse_shard(s)
+
+
+@pytest.mark.parametrize('by_size', (False, True))
+def test_select_partitions(by_size):
+    filenames = [f'pkg/mod{i}.py' for i in range(100)]
+    parts = [
+        select(filenames, Shard(k, 4), by_size=by_size)
+        for k in range(1, 5)
+    ]
+    assert sorted(sum(parts, [])) == sorted(filenames)
+    # the original order is kept
+    for part in parts:
+        assert part == sorted(part, key=filenames.index)
+
+
+def test_select_by_hash_is_stable():
+    filenames = [f'mod{i}.py' for i in range(20)]
+    part = select(filenames, Shard(1, 3), by_size=False)
+    # adding files does not move the others
+    more = select([*filenames, 'new.py'], Shard(1, 3), by_size=False)
+    assert [f for f in more if f != 'new.py'] == part
+
+
+def test_select_by_size(tmpdir):
+    filenames = []
+    for name, size in (('a', 100), ('b', 60), ('c', 50), ('d', 10)):
+        f = tmpdir.join(f'{name}.py')
+        f.write('x' * size)
+        filenames.append(str(f))
+    a, b, c, d = filenames
+    assert select(filenames, Shard(1, 2), by_size=True) == [a, d]
+    assert select(filenames, Shard(2, 2), by_size=True) == [b, c]
+
+
+def _write(tmpdir, shard, returncode, failed):
+    filename = str(tmpdir.join(f'results{shard.k}.json'))
+    write_results(
+        filename,
+        shard=shard,
+        returncode=returncode,
+        files=['f.py', 'g.py'],
+        failed=failed,
+    )
+    return filename
+
+
+def test_merge_reports(tmpdir, capsys):
+    reports = [
+        _write(tmpdir, Shard(1, 2), 0, []),
+        _write(tmpdir, Shard(2, 2), 1, ['h.py', 'g.py']),
+    ]
+    assert merge_reports(reports) == 1
+    out, _ = capsys.readouterr()
+    assert json.loads(out) == {
+        'returncode': 1, 'files': 4, 'failed': ['g.py', 'h.py'],
+    }
+
+
+def test_merge_reports_all_clean(tmpdir, capsys):
+    reports = [
+        _write(tmpdir, Shard(1, 2), 0, []),
+        _write(tmpdir, Shard(2, 2), 0, []),
+    ]
+    assert merge_reports(reports) == 0
+
+
+def test_merge_reports_missing_shard(tmpdir, capsys):
+    reports = [_write(tmpdir, Shard(1, 3), 0, [])]
+    assert merge_reports(reports) == 1
+    _, err = capsys.readouterr()
+    assert err == 'missing shards: 2/3, 3/3\n'
+
+
+def test_merge_reports_duplicate_shard(tmpdir, capsys):
+    report = _write(tmpdir, Shard(1, 1), 0, [])
+    assert merge_reports([report, report]) == 1
+    _, err = capsys.readouterr()
+    assert err == f'{report}: shard 1/1 already in {report}\n'
+
+
+def test_merge_reports_different_counts(tmpdir, capsys):
+    reports = [
+        _write(tmpdir, Shard(1, 1), 0, []),
+        _write(tmpdir, Shard(2, 2), 0, []),
+    ]
+    assert merge_reports(reports) == 1
+    _, err = capsys.readouterr()
+    assert err == 'results are from different numbers of shards\n'
+
+
+def test_merge_reports_unreadable(tmpdir, capsys):
+    missing = str(tmpdir.join('missing.json'))
+    assert merge_reports([missing]) == 1
+    _, err = capsys.readouterr()
+    assert err.startswith(f'{missing}: cannot read results (')
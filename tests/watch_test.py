@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import os
+import time
+from unittest import mock
+
+from pyupgrade._watch import scan
+from pyupgrade._watch import watch
+
+
+def test_scan(tmpdir):
+    tmpdir.join('a.py').write('x = 1\n')
+    tmpdir.join('b.txt').write('hi\n')
+    tmpdir.join('pkg/c.py').ensure().write('y = 22\n')
+    tmpdir.join('.tox/d.py').ensure().write('z = 3\n')
+    ret = scan(str(tmpdir))
+    assert sorted(ret) == [
+        os.path.join(str(tmpdir), 'a.py'),
+        os.path.join(str(tmpdir), 'pkg', 'c.py'),
+    ]
+    assert ret[os.path.join(str(tmpdir), 'pkg', 'c.py')][1] == 7
+
+
+def test_watch_reruns_changed_files(tmpdir):
+    a = tmpdir.join('a.py')
+    a.write('x = 1\n')
+    b = tmpdir.join('b.py')
+    b.write('y = 2\n')
+    calls = []
+
+    def func(filename):
+        calls.append(filename)
+        if filename == str(b) and len(calls) == 2:
+            # our own rewrites are not picked up as changes
+            b.write('y = 22\n')
+            # but an edit in between polls is
+            a.write('x = 11\n')
+
+    watch(str(tmpdir), func, interval=0, polls=2)
+    assert calls == [str(a), str(b), str(a)]
+
+
+def test_scan_missing_root(tmpdir):
+    assert scan(str(tmpdir.join('missing'))) == {}
+
+
+def test_watch_file_removed_while_processing(tmpdir):
+    a = tmpdir.join('a.py')
+    a.write('x = 1\n')
+    b = tmpdir.join('b.py')
+    b.write('y = 2\n')
+    calls = []
+
+    def func(filename):
+        calls.append(filename)
+        if filename == str(a) and len(calls) == 1:
+            b.remove()
+        with open(filename) as f:
+            f.read()
+
+    def sleep(interval):
+        b.write('y = 2\n')
+
+    with mock.patch.object(time, 'sleep', sleep):
+        watch(str(tmpdir), func, interval=0, polls=2)
+    # a file which comes back is processed again
+    assert calls == [str(a), str(b), str(b)]